@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+
+# Roughly one point per horizontal pixel of a full-width chart
+DEFAULT_MAX_POINTS = 1000
+
+
+def filter_date_range(df, start_date=None, end_date=None, date_column='date'):
+    """Returns the rows whose date lies within [start_date, end_date]"""
+    mask = np.ones(len(df), dtype=bool)
+    if start_date is not None:
+        mask &= (df[date_column] >= start_date).to_numpy()
+    if end_date is not None:
+        mask &= (df[date_column] <= end_date).to_numpy()
+    return df[mask]
+
+
+def _bucket_extreme_positions(values, buckets, bucket_starts, largest):
+    """Positions of the min (or max) value of every bucket, NaN values are never picked first"""
+    order = np.lexsort((-values if largest else values, buckets))
+    return order[bucket_starts]
+
+
+def minmax_downsample(df, value_columns, max_points=DEFAULT_MAX_POINTS):
+    """
+    Reduces df to at most about max_points rows by splitting it into equal-count buckets and
+    keeping, per bucket, the rows holding the minimum and maximum of each value column,
+    plus the first and last row. Spikes survive because extremes are never averaged away.
+
+    Frames that already fit are returned unchanged, so narrow date ranges are shown at
+    full resolution.
+    """
+    row_count = len(df)
+    if max_points is None or row_count <= max_points:
+        return df
+
+    bucket_count = max(1, max_points // (2 * max(1, len(value_columns))))
+    buckets = np.arange(row_count) * bucket_count // row_count
+    bucket_starts = np.flatnonzero(np.diff(buckets, prepend=-1))
+
+    keep = np.zeros(row_count, dtype=bool)
+    keep[[0, -1]] = True
+    for column in value_columns:
+        values = pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+        keep[_bucket_extreme_positions(values, buckets, bucket_starts, largest=False)] = True
+        keep[_bucket_extreme_positions(values, buckets, bucket_starts, largest=True)] = True
+
+    return df[keep]
+
+
+def sum_downsample(df, value_columns, max_points=DEFAULT_MAX_POINTS, date_column='date'):
+    """
+    Reduces df to at most about max_points values by summing equal-count buckets of rows,
+    each labelled with the date of its first row. Meant for amounts such as additives,
+    where dropping rows like minmax_downsample does would under-report the totals.
+
+    Frames that already fit are returned unchanged.
+    """
+    row_count = len(df)
+    if max_points is None or row_count <= max_points:
+        return df
+
+    bucket_count = max(1, max_points // max(1, len(value_columns)))
+    if row_count <= bucket_count:
+        return df
+    buckets = np.arange(row_count) * bucket_count // row_count
+
+    grouped = df.groupby(buckets, sort=True)
+    totals = grouped[value_columns].sum(min_count=1)
+    totals.insert(0, date_column, grouped[date_column].first())
+    return totals.reset_index(drop=True)
@@ -0,0 +1,57 @@
+import hashlib
+
+import pandas as pd
+import plotly.graph_objects as go
+import plotly.io
+
+from db.query_cache import QueryCache
+
+# Above this many points per trace, scatter traces are drawn with WebGL instead of SVG
+DEFAULT_WEBGL_THRESHOLD = 1000
+
+figure_cache = QueryCache(max_size=64)
+figure_json_cache = QueryCache(max_size=64)
+
+
+def scatter_class(point_count, webgl_threshold=DEFAULT_WEBGL_THRESHOLD):
+    """Returns go.Scattergl for traces above the threshold and go.Scatter otherwise"""
+    if webgl_threshold is not None and point_count > webgl_threshold:
+        return go.Scattergl
+    return go.Scatter
+
+
+def frame_fingerprint(df):
+    """Content hash of a DataFrame including its index and column names"""
+    digest = hashlib.sha256(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    digest.update(repr(list(df.columns)).encode())
+    return digest.hexdigest()
+
+
+def _figure_key(plot_function, df, options):
+    return plot_function.__qualname__, frame_fingerprint(df), tuple(sorted(options.items()))
+
+
+def cached_figure(plot_function, df, _key=None, **options):
+    """
+    Returns plot_function(df, **options), reusing the figure built for an identical
+    frame and identical options. Options must be hashable.
+    """
+    key = _key or _figure_key(plot_function, df, options)
+    found, fig = figure_cache.get(key)
+    if not found:
+        fig = plot_function(df, **options)
+        figure_cache.set(key, fig)
+    return fig
+
+
+def cached_figure_json(plot_function, df, **options):
+    """
+    Plotly JSON of cached_figure(plot_function, df, **options), serialized once per
+    identical frame and options. Render it with components.plotly_spec_chart.
+    """
+    key = _figure_key(plot_function, df, options)
+    found, spec = figure_json_cache.get(key)
+    if not found:
+        spec = plotly.io.to_json(cached_figure(plot_function, df, _key=key, **options), validate=False)
+        figure_json_cache.set(key, spec)
+    return spec
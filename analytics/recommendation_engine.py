@@ -0,0 +1,324 @@
+import hashlib
+import json
+
+import numpy as np
+import pandas as pd
+
+from db.query_cache import QueryCache, get_data_version
+
+# EC increase per ml of nutrient in a 1L solution. This is a simplification; real-world values would need calibration
+EC_PER_ML = 0.05
+
+# pH adjuster strength factors, adjust based on pH solution strength
+PH_DOWN_STRENGTH = 1.2
+PH_UP_STRENGTH = 1.0
+
+NPK_SCALE = {"very_low": 1, "low": 2, "medium": 3, "high": 4, "very_high": 5}
+
+# Water temperature ranges by plant type
+TEMP_RANGES = {
+    "leafy_greens": {"min": 18, "max": 23, "optimal": 20},
+    "fruiting": {"min": 20, "max": 26, "optimal": 23},
+    "herbs": {"min": 18, "max": 24, "optimal": 21}
+}
+DEFAULT_TEMP_RANGE = {"min": 18, "max": 24, "optimal": 21}
+
+DEFAULT_TARGETS = {"ph_target": 6.0, "ec_target": 1.2, "n": "medium", "p": "medium", "k": "medium"}
+DEFAULT_SYSTEM = {"description": "Unknown", "ec_modifier": 1.0, "change_frequency_days": 14}
+
+# Key used when one settings bundle applies to every reading
+_SHARED_SETTINGS = "__shared__"
+
+recommendation_cache = QueryCache(max_size=128)
+
+
+def calculate_ph_down_ml(ph_deviation, volume_liters):
+    """Calculates approximate pH down solution needed"""
+    # This is a rough approximation - actual amount depends on water hardness and pH down strength
+    return max(0.5, round(ph_deviation * volume_liters * PH_DOWN_STRENGTH, 1))
+
+
+def calculate_ph_up_ml(ph_deviation, volume_liters):
+    """Calculates approximate pH up solution needed"""
+    # This is a rough approximation - actual amount depends on water hardness and pH up strength
+    return max(0.5, round(ph_deviation * volume_liters * PH_UP_STRENGTH, 1))
+
+
+def calculate_water_add(current_ec, target_ec, volume_liters):
+    """Calculates water needed to dilute nutrient solution"""
+    if current_ec <= target_ec:
+        return 0
+
+    # C1 * V1 = C2 * V2, where C2 = C1 * V1 / V2
+    # So V2 = C1 * V1 / C2, and water to add = V2 - V1
+    final_volume = current_ec * volume_liters / target_ec
+    water_to_add = final_volume - volume_liters
+
+    # Cap at reasonable values and round
+    return min(round(water_to_add, 1), volume_liters)
+
+
+def evaluate_water_temp(temp, plant_type):
+    """Evaluates if water temperature is optimal for plant type"""
+    # Get range for current plant type, or use default
+    range_data = TEMP_RANGES.get(plant_type, DEFAULT_TEMP_RANGE)
+
+    if temp < range_data["min"]:
+        return "too_cold"
+    elif temp > range_data["max"]:
+        return "too_warm"
+    else:
+        return "optimal"
+
+
+def rank_nutrient_products(n_need, p_need, k_need, products, growth_stage):
+    """
+    Scores products on how well they match the NPK needs and returns
+    (product_name, score) pairs, best match first
+    """
+    # Convert textual NPK needs to numeric scale (1-5)
+    n_value = NPK_SCALE.get(n_need, 3)
+    p_value = NPK_SCALE.get(p_need, 3)
+    k_value = NPK_SCALE.get(k_need, 3)
+
+    # Filter products suitable for the current growth stage
+    suitable_products = {}
+    for product_name, product_data in products.items():
+        if product_data.get("stage") in ["all", growth_stage]:
+            suitable_products[product_name] = product_data
+
+    if not suitable_products:
+        # Fallback to all products if none match the current stage
+        suitable_products = products
+
+    # Score each product based on how well it matches NPK needs
+    product_scores = {}
+    for product_name, product_data in suitable_products.items():
+        n_match = 5 - abs(NPK_SCALE.get(product_data.get("n"), 3) - n_value)
+        p_match = 5 - abs(NPK_SCALE.get(product_data.get("p"), 3) - p_value)
+        k_match = 5 - abs(NPK_SCALE.get(product_data.get("k"), 3) - k_value)
+
+        # Weight the scores based on importance
+        product_scores[product_name] = (n_match * n_value + p_match * p_value + k_match * k_value) / (
+                    n_value + p_value + k_value)
+
+    return sorted(product_scores.items(), key=lambda x: x[1], reverse=True)
+
+
+def calculate_nutrient_additions(ec_deficit, volume_liters, n_need, p_need, k_need, products, growth_stage,
+                                 nutrient_strength="medium"):
+    """
+    Calculate nutrient additions based on required NPK levels
+    Returns a dictionary of product names and ml to add
+    """
+    # Select products to use based on scores
+    selected_products = rank_nutrient_products(n_need, p_need, k_need, products, growth_stage)
+
+    # Calculate amounts
+    results = {}
+    remaining_ec = ec_deficit
+
+    # Get ml_per_liter based on selected strength
+    ml_key = f"ml_per_liter_{nutrient_strength}"
+
+    for product_name, score in selected_products[:2]:  # Use top 2 products
+        # Get dosage from product data
+        ml_per_liter = products[product_name].get(ml_key, 2.0)
+
+        # Calculate amount to add
+        # If this is the primary nutrient, give it 70% of the remaining EC deficit
+        if product_name == selected_products[0][0]:
+            ec_share = remaining_ec * 0.7
+        else:
+            ec_share = remaining_ec * 0.3
+
+        ml_to_add = round((ec_share / EC_PER_ML) * volume_liters / 10, 1)
+
+        # Cap based on recommended dosage
+        max_ml = ml_per_liter * volume_liters
+        ml_to_add = min(ml_to_add, max_ml)
+
+        if ml_to_add >= 0.5:  # Only include if it's at least 0.5ml
+            results[product_name] = ml_to_add
+            remaining_ec -= (ml_to_add * EC_PER_ML * 10) / volume_liters
+
+    return results
+
+
+def resolve_targets(settings):
+    """
+    Resolves the targets and tolerances of one settings bundle.
+
+    Args:
+        settings: dict with the nutrient_settings, nutrient_profiles, nutrient_products
+            and system_types objects stored by the settings page
+
+    Returns:
+        dict of targets; `profile_found` is False when the plant type and growth stage
+        have no profile and the defaults were used
+    """
+    nutrient_settings = settings["nutrient_settings"]
+    system_type = nutrient_settings.get("system_type", "dwc")
+    plant_type = nutrient_settings.get("plant_type", "leafy_greens")
+    growth_stage = nutrient_settings.get("growth_stage", "vegetative")
+    system_info = settings["system_types"].get(system_type, DEFAULT_SYSTEM)
+
+    try:
+        target_values = settings["nutrient_profiles"][plant_type][growth_stage]
+        ec_target = target_values["ec_target"] * system_info["ec_modifier"]  # Adjust EC based on system
+        profile_found = True
+    except (KeyError, TypeError):
+        target_values = DEFAULT_TARGETS
+        ec_target = DEFAULT_TARGETS["ec_target"]
+        profile_found = False
+
+    return {
+        "profile_found": profile_found,
+        "system_type": system_type,
+        "system_info": system_info,
+        "plant_type": plant_type,
+        "growth_stage": growth_stage,
+        "ph_target": target_values["ph_target"],
+        "ec_target": ec_target,
+        "n": target_values["n"],
+        "p": target_values["p"],
+        "k": target_values["k"],
+        "ph_tolerance": nutrient_settings.get("ph_tolerance", 0.3),
+        "ec_tolerance": nutrient_settings.get("ec_tolerance", 0.3),
+        "water_volume": nutrient_settings.get("water_volume_liters", 20),
+        "base_water_ec": nutrient_settings.get("base_water_ec", 0.0),
+        "nutrient_strength": nutrient_settings.get("nutrient_strength", "medium"),
+    }
+
+
+def _target_table(settings_by_key):
+    """One row of resolved targets and top-2 products per settings key"""
+    rows = {}
+    for key, settings in settings_by_key.items():
+        targets = resolve_targets(settings)
+        products = settings["nutrient_products"]
+        ranked = rank_nutrient_products(targets["n"], targets["p"], targets["k"], products, targets["growth_stage"])
+        ml_key = f"ml_per_liter_{targets['nutrient_strength']}"
+        temp_range = TEMP_RANGES.get(targets["plant_type"], DEFAULT_TEMP_RANGE)
+
+        row = {name: value for name, value in targets.items() if name != "system_info"}
+        row["temp_min"] = temp_range["min"]
+        row["temp_max"] = temp_range["max"]
+        for rank in (1, 2):
+            product_name = ranked[rank - 1][0] if len(ranked) >= rank else None
+            row[f"product_{rank}"] = product_name
+            row[f"product_{rank}_ml_per_liter"] = products[product_name].get(ml_key, 2.0) if product_name else np.nan
+        rows[key] = row
+    return pd.DataFrame.from_dict(rows, orient="index")
+
+
+def recommend(readings, settings, settings_column="username"):
+    """
+    Vectorized recommendations for every row of a readings frame.
+
+    Args:
+        readings: DataFrame with `ph_final` and `ec_final` and optionally `water_temp`
+        settings: one settings bundle (see resolve_targets) applied to every row, or a
+            dict mapping the values of `settings_column` to settings bundles
+        settings_column: column of readings that selects the settings bundle
+
+    Returns:
+        DataFrame aligned with readings holding targets, deviations, pH adjuster and
+        dilution amounts, up to two nutrient additions and the water temperature status
+
+    Amounts are rounded with NumPy, so at exact .x5 boundaries they can differ by 0.1
+    from the scalar calculate_* helpers.
+    """
+    if "nutrient_settings" in settings:
+        settings_by_key = {_SHARED_SETTINGS: settings}
+        keys = np.full(len(readings), _SHARED_SETTINGS, dtype=object)
+    else:
+        settings_by_key = settings
+        keys = readings[settings_column].to_numpy()
+
+    targets = _target_table(settings_by_key)
+    row_targets = targets.reindex(keys)
+    row_targets.index = readings.index
+
+    def target(name):
+        return row_targets[name].to_numpy(dtype=float)
+
+    ph = readings["ph_final"].to_numpy(dtype=float)
+    ec = readings["ec_final"].to_numpy(dtype=float)
+    volume = target("water_volume")
+    ph_tolerance = target("ph_tolerance")
+    ec_tolerance = target("ec_tolerance")
+    ec_target = target("ec_target")
+
+    ph_deviation = ph - target("ph_target")
+    adjusted_ec = np.maximum(0, ec - target("base_water_ec"))
+    ec_deviation = adjusted_ec - ec_target
+
+    ph_too_high = ph_deviation > ph_tolerance
+    ph_too_low = ph_deviation < -ph_tolerance
+    ec_too_high = ec_deviation > ec_tolerance
+    ec_too_low = ec_deviation < -ec_tolerance
+
+    ph_down_ml = np.where(ph_too_high, np.maximum(0.5, np.round(ph_deviation * volume * PH_DOWN_STRENGTH, 1)), 0.0)
+    ph_up_ml = np.where(ph_too_low, np.maximum(0.5, np.round(-ph_deviation * volume * PH_UP_STRENGTH, 1)), 0.0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        water_to_add = np.minimum(np.round(adjusted_ec * volume / ec_target - volume, 1), volume)
+    water_add_liters = np.where(ec_too_high, water_to_add, 0.0)
+
+    # Top product gets 70% of the EC deficit, the runner-up 30% of what is left
+    remaining_ec = np.where(ec_too_low, ec_target - adjusted_ec, 0.0)
+    nutrient_ml = {}
+    for rank, share in ((1, 0.7), (2, 0.3)):
+        max_ml = target(f"product_{rank}_ml_per_liter") * volume
+        ml_to_add = np.minimum(np.round((remaining_ec * share / EC_PER_ML) * volume / 10, 1), max_ml)
+        included = ec_too_low & (ml_to_add >= 0.5)
+        nutrient_ml[rank] = np.where(included, ml_to_add, 0.0)
+        remaining_ec = remaining_ec - np.where(included, (ml_to_add * EC_PER_ML * 10) / volume, 0.0)
+
+    result = pd.DataFrame({
+        "ph_target": target("ph_target"),
+        "ec_target": ec_target,
+        "ph_deviation": ph_deviation,
+        "adjusted_ec": adjusted_ec,
+        "ec_deviation": ec_deviation,
+        "ph_in_range": ~(ph_too_high | ph_too_low),
+        "ec_in_range": ~(ec_too_high | ec_too_low),
+        "ph_down_ml": ph_down_ml,
+        "ph_up_ml": ph_up_ml,
+        "water_add_liters": water_add_liters,
+        "nutrient_1": row_targets["product_1"].to_numpy(),
+        "nutrient_1_ml": nutrient_ml[1],
+        "nutrient_2": row_targets["product_2"].to_numpy(),
+        "nutrient_2_ml": nutrient_ml[2],
+    }, index=readings.index)
+    result["in_range"] = result["ph_in_range"] & result["ec_in_range"]
+
+    if "water_temp" in readings.columns:
+        water_temp = readings["water_temp"].to_numpy(dtype=float)
+        result["water_temp_status"] = np.select(
+            [water_temp < target("temp_min"), water_temp > target("temp_max")],
+            ["too_cold", "too_warm"],
+            default="optimal"
+        )
+
+    return result
+
+
+def recommendation_key(settings, last_entry_id, *extra):
+    """Stable hash of a settings bundle, the latest entry id and any extra key parts"""
+    payload = json.dumps([settings, last_entry_id, list(extra)], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def get_cached_recommendation(settings, last_entry_id, build, *extra_key):
+    """
+    Returns build() for this settings bundle and latest entry, reusing the finished
+    result until the settings, the latest entry or the data version change.
+    """
+    key = recommendation_key(settings, last_entry_id, get_data_version(), *extra_key)
+    found, result = recommendation_cache.get(key)
+    if not found:
+        result = build()
+        recommendation_cache.set(key, result)
+    return result
@@ -0,0 +1,14 @@
+import numpy as np
+
+
+def interleave_before_after(df, before_column, after_column, date_column='date'):
+    """
+    Builds the "Daily Progress" timeline of a before/after metric: every date appears
+    twice, first with its before value and then with its after value.
+
+    Returns:
+        (dates, values) as NumPy arrays of length 2 * len(df)
+    """
+    dates = np.repeat(df[date_column].to_numpy(), 2)
+    values = np.column_stack((df[before_column].to_numpy(), df[after_column].to_numpy())).ravel()
+    return dates, values
@@ -0,0 +1,40 @@
+import json
+
+import plotly.io
+import streamlit as st
+
+
+def plotly_spec_chart(spec, use_container_width=True):
+    """
+    Renders a Plotly figure that is already serialized to JSON (see
+    analytics.figures.cached_figure_json). st.plotly_chart copies and re-serializes the
+    figure on every rerun, which dominates the rerun for charts with many points.
+    Falls back to st.plotly_chart if Streamlit's element internals have moved.
+    """
+    try:
+        from streamlit.elements.lib.form_utils import current_form_id
+        from streamlit.elements.lib.utils import compute_and_register_element_id
+        from streamlit.proto.PlotlyChart_pb2 import PlotlyChart as PlotlyChartProto
+    except ImportError:
+        st.plotly_chart(plotly.io.from_json(spec), use_container_width=use_container_width)
+        return
+
+    # Same fields st.plotly_chart sets for a chart without selections
+    proto = PlotlyChartProto()
+    proto.use_container_width = use_container_width
+    proto.theme = "streamlit"
+    proto.form_id = current_form_id(st._main)
+    proto.spec = spec
+    proto.config = json.dumps({"showLink": False, "linkText": False})
+    proto.id = compute_and_register_element_id(
+        "plotly_chart",
+        user_key=None,
+        form_id=proto.form_id,
+        plotly_spec=proto.spec,
+        plotly_config=proto.config,
+        selection_mode=(),
+        is_selection_activated=False,
+        theme="streamlit",
+        use_container_width=use_container_width,
+    )
+    st._main._enqueue("plotly_chart", proto)
@@ -1,29 +1,17 @@
 from db.database import conn
-from db.database_handler import get_all_runs
+from db.run_registry import get_run_registry
+from db.settings_store import get_settings, update_settings
 from model.hydro_run import HydroRun
-from streamlit_local_storage import LocalStorage
 import streamlit as st
 
 def run_selector():
-    local_storage = LocalStorage()
-    runs = get_all_runs()
-    if local_storage.getItem("selected_run_id") is None:
-        selected_run = st.selectbox("Select run", runs)
-        if selected_run is not None:
-            local_storage.setItem("selected_run_id", selected_run.id)
-    else:
-        selected_run_id = local_storage.getItem("selected_run_id")
-        selected_run = None
-        for run in runs:
-            if run.id == selected_run_id:
-                selected_run = run
+    run_registry = get_run_registry()
+    selected_run_id = get_settings().selected_run_id
 
-        if (selected_run is not None):
-            selected_run = st.selectbox("Select run", runs, index=runs.index(selected_run))
-        else:
-            selected_run = st.selectbox("Select run", runs)
+    selected_run = st.selectbox("Select run", run_registry.runs, index=run_registry.position(selected_run_id))
 
-        local_storage.setItem("selected_run_id", selected_run.id)
+    # Only written back when the selection actually changed
+    if selected_run is not None:
+        update_settings(selected_run_id=selected_run.id)
 
     return selected_run
-
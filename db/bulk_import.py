@@ -0,0 +1,273 @@
+"""
+Chunked bulk import of historical entries from CSV or Parquet files.
+
+Files are read in chunks, mapped onto the hydro_data_entry columns, validated with
+vectorized checks and written with COPY on PostgreSQL or executemany elsewhere. The
+whole import runs in one transaction, so a failing chunk leaves no partial import.
+
+Command line:
+
+    python -m db.bulk_import logs.csv --username alice --run-id 3 --map "pH=ph_initial" --map "EC=ec_initial"
+"""
+import argparse
+import csv
+import io
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert, select
+
+from db.database import conn
+from db.query_cache import bump_data_version
+from db.rollups import rebuild_rollups
+from model.hydro_data_entry import HydroDataEntry, ENTRY_COLUMNS, get_entry_records_from_df
+from model.hydro_run import HydroRun
+
+DEFAULT_CHUNK_SIZE = 10_000
+
+# Rejected rows kept for the report, the rest are only counted
+MAX_REJECTED_SAMPLE = 100
+
+IMPORT_COLUMNS = [col for col in ENTRY_COLUMNS if col != 'id']
+
+REQUIRED_COLUMNS = ['date', 'run_id', 'ph_initial', 'ec_initial', 'ph_final', 'ec_final',
+                    'light_hours', 'light_intensity']
+
+FLOAT_COLUMNS = ['ph_initial', 'ec_initial', 'ph_final', 'ec_final',
+                 'ph_down_added', 'ph_up_added', 'hydro_vega_added', 'hydro_flora_added', 'boost_added',
+                 'rhizotonic_added', 'water_temp', 'water_added', 'water_level', 'humidity', 'air_temp']
+
+INTEGER_COLUMNS = ['run_id', 'light_hours', 'light_intensity']
+
+TEXT_COLUMNS = ['other_actions', 'observations', 'comments']
+
+# Optional numeric columns default to 0 like the model columns
+ZERO_DEFAULT_COLUMNS = [col for col in FLOAT_COLUMNS if col not in REQUIRED_COLUMNS]
+
+# column -> (min, max), inclusive
+VALUE_RANGES = {
+    'ph_initial': (0, 14),
+    'ph_final': (0, 14),
+    'ec_initial': (0, None),
+    'ec_final': (0, None),
+    'light_hours': (0, 24),
+    'light_intensity': (0, 100),
+    'humidity': (0, 100)
+}
+
+
+@dataclass
+class ImportResult:
+    rows_read: int = 0
+    rows_imported: int = 0
+    rows_rejected: int = 0
+    seconds: float = 0.0
+    run_ids: set = field(default_factory=set)
+    rejected_sample: pd.DataFrame = None
+
+    @property
+    def rows_per_second(self):
+        return self.rows_imported / self.seconds if self.seconds else 0.0
+
+
+def normalize_column_name(name):
+    """'Water Temp' -> 'water_temp'"""
+    return str(name).strip().lower().replace(' ', '_').replace('-', '_')
+
+
+def map_columns(chunk, column_map=None):
+    """
+    Renames source columns onto entry columns. Explicit column_map entries win, other
+    columns are matched by their normalized name; unknown columns are dropped.
+    """
+    column_map = column_map or {}
+    renames = {}
+    for source in chunk.columns:
+        target = column_map.get(source, normalize_column_name(source))
+        if target in IMPORT_COLUMNS and target not in renames.values():
+            renames[source] = target
+    return chunk[list(renames)].rename(columns=renames)
+
+
+def validate_chunk(chunk, run_id=None):
+    """
+    Coerces a mapped chunk to the entry schema and splits it into valid rows and
+    rejected rows (the latter with a `reason` column). All checks are vectorized.
+    """
+    chunk = chunk.copy()
+    if run_id is not None:
+        chunk['run_id'] = run_id
+
+    # Measure-only logs have no final readings, like the entry form those equal the initial ones
+    for final, initial in (('ph_final', 'ph_initial'), ('ec_final', 'ec_initial')):
+        if final not in chunk.columns and initial in chunk.columns:
+            chunk[final] = chunk[initial]
+
+    for col in IMPORT_COLUMNS:
+        if col not in chunk.columns:
+            chunk[col] = np.nan if col not in TEXT_COLUMNS else None
+
+    chunk['date'] = pd.to_datetime(chunk['date'], errors='coerce').dt.date
+    for col in FLOAT_COLUMNS + INTEGER_COLUMNS:
+        chunk[col] = pd.to_numeric(chunk[col], errors='coerce')
+    chunk[ZERO_DEFAULT_COLUMNS] = chunk[ZERO_DEFAULT_COLUMNS].fillna(0)
+    chunk[TEXT_COLUMNS] = chunk[TEXT_COLUMNS].astype(object).where(chunk[TEXT_COLUMNS].notna(), None)
+
+    reason = pd.Series(None, index=chunk.index, dtype=object)
+    for col in REQUIRED_COLUMNS:
+        reason = reason.where(reason.notna() | chunk[col].notna(), f"missing {col}")
+    for col in INTEGER_COLUMNS:
+        fractional = chunk[col].notna() & (chunk[col] % 1 != 0)
+        reason = reason.where(reason.notna() | ~fractional, f"{col} is not a whole number")
+    for col, (low, high) in VALUE_RANGES.items():
+        out_of_range = pd.Series(False, index=chunk.index)
+        if low is not None:
+            out_of_range |= chunk[col] < low
+        if high is not None:
+            out_of_range |= chunk[col] > high
+        reason = reason.where(reason.notna() | ~out_of_range, f"{col} out of range")
+
+    valid = chunk[reason.isna()][IMPORT_COLUMNS]
+    valid = valid.astype({col: 'int64' for col in INTEGER_COLUMNS})
+    rejected = chunk[reason.notna()].assign(reason=reason[reason.notna()])
+    return valid, rejected
+
+
+def _copy_rows(connection, rows):
+    """COPY ... FROM STDIN through the psycopg2 cursor of the current transaction"""
+    # COPY skips column defaults, so the incremental-load watermark is set here
+    rows = rows.assign(updated_at=datetime.now().isoformat(sep=' '))
+    buffer = io.StringIO()
+    rows.to_csv(buffer, index=False, header=False, na_rep='', quoting=csv.QUOTE_MINIMAL)
+    buffer.seek(0)
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f"COPY {HydroDataEntry.__tablename__} ({', '.join(rows.columns)}) FROM STDIN WITH (FORMAT csv)",
+            buffer)
+    finally:
+        cursor.close()
+
+
+def _insert_rows(connection, rows):
+    if connection.dialect.name == 'postgresql':
+        _copy_rows(connection, rows)
+    else:
+        # updated_at is filled in by its column default
+        connection.execute(insert(HydroDataEntry.__table__), get_entry_records_from_df(rows))
+
+
+def read_chunks(source, file_format, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Yields DataFrames of at most chunk_size rows from a CSV or Parquet path or file object"""
+    if file_format == 'csv':
+        yield from pd.read_csv(source, chunksize=chunk_size)
+    elif file_format == 'parquet':
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        raise ValueError(f"Unsupported import format: {file_format}")
+
+
+def import_entries(source, file_format, username, run_id=None, column_map=None,
+                   chunk_size=DEFAULT_CHUNK_SIZE, progress=None):
+    """
+    Imports entries from a CSV or Parquet source in one transaction and rebuilds the
+    rollups of the runs it touched.
+
+    Args:
+        source: path or file object
+        file_format: 'csv' or 'parquet'
+        username: owner of the runs rows may be imported into, rows for other runs are rejected
+        run_id: run every row is imported into, otherwise a run_id column is required
+        column_map: dict of source column -> entry column for headings that differ
+        chunk_size: rows read, validated and written at a time
+        progress: optional callable receiving the ImportResult after every chunk
+
+    Returns:
+        ImportResult with counts, rows per second and a sample of rejected rows
+    """
+    result = ImportResult()
+    rejected_samples = []
+    started = time.perf_counter()
+    run_table = HydroRun.__table__
+
+    with conn.engine.begin() as connection:
+        known_runs = set(connection.execute(
+            select(run_table.c.id).where(run_table.c.username == username)).scalars())
+
+        for chunk in read_chunks(source, file_format, chunk_size):
+            valid, rejected = validate_chunk(map_columns(chunk, column_map), run_id)
+
+            unknown_run = ~valid['run_id'].isin(known_runs)
+            if unknown_run.any():
+                rejected = pd.concat([rejected, valid[unknown_run].assign(reason="unknown run_id")])
+                valid = valid[~unknown_run]
+
+            if not valid.empty:
+                _insert_rows(connection, valid)
+                result.run_ids.update(int(run) for run in valid['run_id'].unique())
+
+            result.rows_read += len(chunk)
+            result.rows_imported += len(valid)
+            result.rows_rejected += len(rejected)
+            kept = sum(len(sample) for sample in rejected_samples)
+            if kept < MAX_REJECTED_SAMPLE and not rejected.empty:
+                rejected_samples.append(rejected.head(MAX_REJECTED_SAMPLE - kept))
+
+            result.seconds = time.perf_counter() - started
+            if progress is not None:
+                progress(result)
+
+        if result.run_ids:
+            rebuild_rollups(connection, sorted(result.run_ids))
+        if result.rows_imported:
+            bump_data_version(connection)
+
+    result.seconds = time.perf_counter() - started
+    result.rejected_sample = pd.concat(rejected_samples) if rejected_samples else pd.DataFrame()
+    return result
+
+
+def _parse_column_map(pairs):
+    column_map = {}
+    for pair in pairs or []:
+        source, _, target = pair.partition('=')
+        if not target:
+            raise argparse.ArgumentTypeError(f"Expected SOURCE=TARGET, got {pair!r}")
+        column_map[source] = target
+    return column_map
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import hydro data entries from CSV or Parquet")
+    parser.add_argument("path")
+    parser.add_argument("--username", required=True, help="user whose runs the entries belong to")
+    parser.add_argument("--format", choices=["csv", "parquet"],
+                        help="defaults to the file extension")
+    parser.add_argument("--run-id", type=int, help="run to import into, otherwise a run_id column is required")
+    parser.add_argument("--map", action="append", metavar="SOURCE=TARGET",
+                        help="map a source column onto an entry column, may be repeated")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    args = parser.parse_args(argv)
+
+    file_format = args.format or ('parquet' if args.path.endswith('.parquet') else 'csv')
+
+    result = import_entries(args.path, file_format, args.username, run_id=args.run_id,
+                            column_map=_parse_column_map(args.map), chunk_size=args.chunk_size,
+                            progress=lambda r: print(f"{r.rows_read} rows read, "
+                                                     f"{r.rows_imported} imported, "
+                                                     f"{r.rows_per_second:.0f} rows/s"))
+
+    print(f"Imported {result.rows_imported} of {result.rows_read} rows in {result.seconds:.1f}s "
+          f"({result.rows_per_second:.0f} rows/s), {result.rows_rejected} rejected")
+    if not result.rejected_sample.empty:
+        print(result.rejected_sample['reason'].value_counts().to_string())
+
+
+if __name__ == "__main__":
+    main()
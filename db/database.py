@@ -31,4 +31,12 @@ def get_db_session():
             session.close()
 
 def init_db():
-    Base.metadata.create_all(conn.engine)
\ No newline at end of file
+    from db.migrations import run_migrations
+
+    Base.metadata.create_all(conn.engine)
+    run_migrations(conn.engine)
+
+
+# Every page and tool reaches the database through this module, so the schema is
+# created and migrated on first import, before any page's queries run
+init_db()
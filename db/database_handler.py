@@ -1,152 +1,235 @@
-from streamlit_local_storage import LocalStorage
+from datetime import datetime
+
 import pandas as pd
 import streamlit as st
+from sqlalchemy import and_, delete, func, insert, or_, select, update
 from sqlalchemy.orm import joinedload
 
 from db.database import get_db_session
-from model.hydro_data_entry import HydroDataEntry, get_entry_from_df
-from model.hydro_run import HydroRun
+from db.query_cache import bump_data_version, cached_query
+from db.rollups import get_affected_dates, refresh_rollups
+from db.settings_store import get_settings
+from model.entry_changes import EntryChanges
+from model.hydro_data_entry import (HydroDataEntry, ENTRY_COLUMNS, EntryPage, get_entries_df_from_rows,
+                                    get_entry_records_from_df, to_db_value)
+from model.hydro_run import HydroRun, RunSummary
 
+DEFAULT_PAGE_SIZE = 100
 
-def get_entries_for_run(run_id, start_date=None, end_date=None):
-    """Get entries for a specific run, optionally filtered by date range"""
-    with get_db_session() as session:
-        query = (session.query(HydroDataEntry)
-                 .options(joinedload(HydroDataEntry.run))
-                 .where(HydroDataEntry.run_id == run_id)
-                 .order_by(HydroDataEntry.date.asc()))
 
-        if start_date:
-            query = query.where(HydroDataEntry.date >= start_date)
-        if end_date:
-            query = query.where(HydroDataEntry.date <= end_date)
+def get_entries_page(run_id=None, username=None, columns=None, page_size=DEFAULT_PAGE_SIZE, after=None, before=None):
+    """
+    Get one keyset page of entries ordered by (date, id), without counting or skipping rows.
+    Defaults to the current user and selected run, and to all entry columns.
 
-        entries = query.all()
-        session.expunge_all()
-        return entries
+    Args:
+        after: (date, id) cursor, returns the page of entries following it
+        before: (date, id) cursor, returns the page of entries preceding it
+            With neither cursor the most recent page is returned.
 
+    Returns:
+        EntryPage with the entries and whether older/newer pages exist
+    """
+    if username is None or run_id is None:
+        settings = get_settings()
+        username = settings.username if username is None else username
+        run_id = settings.selected_run_id if run_id is None else run_id
 
-def get_all_entries():
-    """Get all entries for the current user and selected run"""
-    with get_db_session() as session:
-        local_storage = LocalStorage()
-        username = local_storage.getItem("username")
-        run_id = local_storage.getItem("selected_run_id")
-
-        # Use joinedload to eagerly load relationships
-        entries = (session.query(HydroDataEntry)
-                   .options(joinedload(HydroDataEntry.run))
-                   .join(HydroRun)
-                   .where(HydroDataEntry.run_id == run_id)
-                   .where(HydroRun.username == username)
-                   .order_by(HydroDataEntry.date.asc())
-                   .all())
-
-        # Detach the objects from the session but ensure all necessary data is loaded
-        session.expunge_all()
-        return entries
-
-
-def get_all_runs():
-    """Get all runs for the current user"""
-    with get_db_session() as session:
-        local_storage = LocalStorage()
-        username = local_storage.getItem("username")
+    columns = list(dict.fromkeys(['id', 'date'] + list(columns or ENTRY_COLUMNS)))
+    return _load_entries_page(run_id, username, tuple(columns), page_size, after, before)
 
-        # Query runs and detach them from session
-        runs = (session.query(HydroRun)
-                .options(joinedload(HydroRun.entries))
-                .where(HydroRun.username == username)
-                .order_by(HydroRun.start_date.desc())
-                .all())
 
-        # Detach objects from session
-        session.expunge_all()
-        print(runs, username)
-        return runs
+@cached_query
+def _load_entries_page(run_id, username, columns, page_size, after, before):
+    columns = list(columns)
+    entry_table = HydroDataEntry.__table__
+    run_table = HydroRun.__table__
 
+    def key_after(key):
+        return or_(entry_table.c.date > key[0], and_(entry_table.c.date == key[0], entry_table.c.id > key[1]))
+
+    def key_before(key):
+        return or_(entry_table.c.date < key[0], and_(entry_table.c.date == key[0], entry_table.c.id < key[1]))
+
+    query = (select(*(entry_table.c[col] for col in columns))
+             .join(run_table, entry_table.c.run_id == run_table.c.id)
+             .where(entry_table.c.run_id == run_id)
+             .where(run_table.c.username == username)
+             .limit(page_size + 1))
+
+    # One extra row tells whether another page follows in the direction of travel
+    if after is not None:
+        query = query.where(key_after(after)).order_by(entry_table.c.date.asc(), entry_table.c.id.asc())
+    else:
+        if before is not None:
+            query = query.where(key_before(before))
+        query = query.order_by(entry_table.c.date.desc(), entry_table.c.id.desc())
 
-def get_last_entry():
-    """Get the last entry for the current user"""
     with get_db_session() as session:
-        local_storage = LocalStorage()
-        username = local_storage.getItem("username")
+        rows = session.execute(query).all()
 
-        last_entry = (session.query(HydroDataEntry)
-                      .options(joinedload(HydroDataEntry.run))
-                      .join(HydroRun)
-                      .where(HydroRun.username == username)
-                      .order_by(HydroDataEntry.date.desc(), HydroDataEntry.id.desc())
-                      .first())
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if after is not None:
+        return EntryPage(get_entries_df_from_rows(rows, columns), has_older=True, has_newer=has_more)
+    return EntryPage(get_entries_df_from_rows(rows[::-1], columns), has_older=has_more, has_newer=before is not None)
 
-        if last_entry:
-            session.expunge(last_entry)
-        return last_entry
 
+def get_run_summaries(username=None):
+    """
+    Get id, name, dates, entry count, last entry date and latest pH/EC of every run of
+    a user from a single aggregate query. Defaults to the current user.
+    """
+    if username is None:
+        username = get_settings().username
+    return _load_run_summaries(username)
+
+
+@cached_query
+def _load_run_summaries(username):
+    entry_table = HydroDataEntry.__table__
+    run_table = HydroRun.__table__
+
+    def latest_value(column):
+        return (select(column)
+                .where(entry_table.c.run_id == run_table.c.id)
+                .order_by(entry_table.c.date.desc(), entry_table.c.id.desc())
+                .limit(1)
+                .correlate(run_table)
+                .scalar_subquery())
+
+    query = (select(run_table.c.id,
+                    run_table.c.name,
+                    run_table.c.start_date,
+                    run_table.c.end_date,
+                    run_table.c.description,
+                    func.count(entry_table.c.id),
+                    func.max(entry_table.c.date),
+                    latest_value(entry_table.c.ph_final),
+                    latest_value(entry_table.c.ec_final))
+             .select_from(run_table.outerjoin(entry_table, entry_table.c.run_id == run_table.c.id))
+             .where(run_table.c.username == username)
+             .group_by(run_table.c.id, run_table.c.name, run_table.c.start_date,
+                       run_table.c.end_date, run_table.c.description)
+             .order_by(run_table.c.start_date.desc(), run_table.c.id.desc()))
 
-def get_entry_by_id(entry_id):
-    """Get a specific entry by ID"""
     with get_db_session() as session:
-        entry = (session.query(HydroDataEntry)
-                 .options(joinedload(HydroDataEntry.run))
-                 .where(HydroDataEntry.id == entry_id)
-                 .first())
+        return [RunSummary(*row) for row in session.execute(query)]
+
 
-        if entry:
-            session.expunge(entry)
-        return entry
+def get_last_entry(run_id=None):
+    """Get the last entry for the current user, or of one of their runs"""
+    return _load_last_entry(get_settings().username, run_id)
 
 
-def update_entry(entry):
-    """Update a single entry"""
+@cached_query
+def _load_last_entry(username, run_id=None):
     with get_db_session() as session:
-        # Merge the entry into the current session
-        merged_entry = session.merge(entry)
-        session.expunge(merged_entry)
-        return merged_entry
+        query = (session.query(HydroDataEntry)
+                 .options(joinedload(HydroDataEntry.run))
+                 .join(HydroRun)
+                 .where(HydroRun.username == username))
+        if run_id is not None:
+            query = query.where(HydroDataEntry.run_id == run_id)
+        last_entry = query.order_by(HydroDataEntry.date.desc(), HydroDataEntry.id.desc()).first()
+
+        if last_entry:
+            session.expunge(last_entry)
+        return last_entry
 
 
-def sync_edited_data(edited_df: pd.DataFrame, original_df: pd.DataFrame):
+@cached_query
+def get_latest_entries_for_active_runs(columns=('ph_final', 'ec_final', 'water_temp')):
     """
-    Syncs edited DataFrame with the database, handling updates, new entries, and deletions
+    Get the latest entry of every run without an end date, across all users, as a
+    DataFrame with username, run_id, entry id and date plus the requested columns.
+    Feed it to analytics.recommendation_engine.recommend to evaluate every active run at once.
     """
-    if edited_df.empty:
+    entry_table = HydroDataEntry.__table__
+    run_table = HydroRun.__table__
+
+    position = (func.row_number()
+                .over(partition_by=entry_table.c.run_id,
+                      order_by=(entry_table.c.date.desc(), entry_table.c.id.desc()))
+                .label('position'))
+    ranked = (select(run_table.c.username,
+                     entry_table.c.run_id,
+                     entry_table.c.id.label('entry_id'),
+                     entry_table.c.date,
+                     *(entry_table.c[col] for col in columns),
+                     position)
+              .join(run_table, entry_table.c.run_id == run_table.c.id)
+              .where(run_table.c.end_date.is_(None))
+              .subquery())
+    query = (select(*(column for column in ranked.c if column.name != 'position'))
+             .where(ranked.c.position == 1)
+             .order_by(ranked.c.username, ranked.c.run_id))
+
+    with get_db_session() as session:
+        result = session.execute(query)
+        return pd.DataFrame(result.all(), columns=list(result.keys()))
+
+
+def _get_update_records(modified: pd.DataFrame, changed_cells: pd.DataFrame):
+    """Builds one record per modified entry containing its id and only the changed columns"""
+    updated_at = datetime.now()
+    records = []
+    for entry_id, values, mask in zip(modified.index,
+                                      modified.itertuples(index=False, name=None),
+                                      changed_cells.itertuples(index=False, name=None)):
+        record = {col: to_db_value(value)
+                  for col, value, changed in zip(modified.columns, values, mask)
+                  if changed and col in HydroDataEntry.__table__.columns}
+        if record:
+            record['id'] = int(entry_id)
+            record['updated_at'] = updated_at
+            records.append(record)
+    return records
+
+
+def sync_edited_data(changes: EntryChanges):
+    """
+    Syncs editor changes with the database, handling updates, new entries, and deletions.
+    Build the changes with changes_from_editor_state from the editor's delta, or with
+    diff_entries when only the edited and original frames are at hand.
+
+    All writes happen in a single transaction with one statement per operation type:
+    an executemany UPDATE of the changed columns, one DELETE ... WHERE id IN (...) and
+    one bulk INSERT.
+    """
+    if changes.is_empty:
         return
 
     try:
         with get_db_session() as session:
-            # Convert date columns to datetime if they're strings
-            if 'date' in edited_df.columns and edited_df['date'].dtype == 'object':
-                edited_df['date'] = pd.to_datetime(edited_df['date'])
-
-            # Handle updates for existing entries
-            for idx, row in edited_df.iterrows():
-                if pd.isna(row['id']):  # New entry
-                    new_entry = get_entry_from_df(row)
-                    session.add(new_entry)
-                else:  # Existing entry
-                    original_row = original_df[original_df['id'] == row['id']].iloc[0] if not original_df[
-                        original_df['id'] == row['id']].empty else None
-
-                    if original_row is not None and not row.equals(original_row):
-                        entry = session.query(HydroDataEntry).filter_by(id=int(row['id'])).first()
-                        if entry:
-                            for column in edited_df.columns:
-                                if column != 'id':
-                                    setattr(entry, column, row[column])
-
-            # Handle deleted entries
-            edited_ids = set(edited_df['id'].dropna().astype(int))
-            original_ids = set(original_df['id'].dropna().astype(int))
-            deleted_ids = original_ids - edited_ids
+            new_rows = changes.new_rows
+            if 'date' in new_rows.columns and new_rows['date'].dtype == 'object':
+                new_rows = new_rows.assign(date=pd.to_datetime(new_rows['date']))
+            insert_records = get_entry_records_from_df(new_rows)
+
+            modified_rows = changes.modified_rows
+            if 'date' in modified_rows.columns and modified_rows['date'].dtype == 'object':
+                modified_rows = modified_rows.assign(date=pd.to_datetime(modified_rows['date']))
+            update_records = _get_update_records(modified_rows, changes.changed_cells)
+
+            deleted_ids = changes.deleted_ids
 
+            if update_records:
+                session.execute(update(HydroDataEntry), update_records)
             if deleted_ids:
-                for deleted_id in deleted_ids:
-                    entry_to_delete = session.query(HydroDataEntry).filter_by(id=deleted_id).first()
-                    if entry_to_delete:
-                        session.delete(entry_to_delete)
+                session.execute(
+                    delete(HydroDataEntry)
+                    .where(HydroDataEntry.id.in_(deleted_ids))
+                    .execution_options(synchronize_session=False)
+                )
+            if insert_records:
+                session.execute(insert(HydroDataEntry), insert_records)
+
+            refresh_rollups(session, get_affected_dates(new_rows, modified_rows,
+                                                        changes.original_rows, changes.deleted_rows))
+            bump_data_version(session)
 
         st.success('Successfully saved changes to database!')
     except Exception as e:
         st.error(f'Error saving to database: {str(e)}')
-        raise
\ No newline at end of file
+        raise
@@ -0,0 +1,149 @@
+"""
+Streaming export of entries to CSV, Parquet or Arrow IPC.
+
+Rows are fetched through a server-side cursor (`yield_per`) and written batch by
+batch, so memory use depends on the batch size and not on the size of the export.
+
+Command line:
+
+    python -m db.export runs.parquet --username alice
+    python -m db.export run3.csv --run-id 3
+"""
+import argparse
+
+import pyarrow as pa
+from sqlalchemy import select
+
+from db.database import conn, init_db
+from model.hydro_data_entry import HydroDataEntry, ENTRY_COLUMNS, ENTRY_DTYPES, get_entries_df_from_rows
+from model.hydro_run import HydroRun
+
+DEFAULT_BATCH_SIZE = 5_000
+
+# format -> (mime type, file extension)
+EXPORT_FORMATS = {
+    'csv': ('text/csv', '.csv'),
+    'parquet': ('application/vnd.apache.parquet', '.parquet'),
+    'arrow': ('application/vnd.apache.arrow.file', '.arrow')
+}
+
+_ARROW_TYPES = {
+    'Int64': pa.int64(),
+    'float64': pa.float64(),
+    'object': pa.string()
+}
+
+# Fixed schema, so batches where a column is entirely NULL still line up
+EXPORT_SCHEMA = pa.schema([
+    (col, pa.date32() if col == 'date' else _ARROW_TYPES[ENTRY_DTYPES[col]])
+    for col in ENTRY_COLUMNS
+])
+
+
+def get_run_ids(username):
+    """Ids of all runs of a user"""
+    run_table = HydroRun.__table__
+    with conn.engine.connect() as connection:
+        return list(connection.execute(
+            select(run_table.c.id).where(run_table.c.username == username).order_by(run_table.c.id)
+        ).scalars())
+
+
+def iter_entry_batches(run_ids, batch_size=DEFAULT_BATCH_SIZE):
+    """Yields typed entries DataFrames of at most batch_size rows, ordered by run, date and id"""
+    entry_table = HydroDataEntry.__table__
+    query = (select(*(entry_table.c[col] for col in ENTRY_COLUMNS))
+             .where(entry_table.c.run_id.in_(run_ids))
+             .order_by(entry_table.c.run_id, entry_table.c.date, entry_table.c.id))
+
+    with conn.engine.connect() as connection:
+        result = connection.execution_options(yield_per=batch_size).execute(query)
+        for rows in result.partitions():
+            yield get_entries_df_from_rows(rows, ENTRY_COLUMNS)
+
+
+def _to_record_batch(df):
+    return pa.RecordBatch.from_pandas(df, schema=EXPORT_SCHEMA, preserve_index=False)
+
+
+def _write_csv(sink, batches):
+    rows = 0
+    for index, df in enumerate(batches):
+        sink.write(df.to_csv(index=False, header=index == 0).encode())
+        rows += len(df)
+    if rows == 0:
+        sink.write((','.join(ENTRY_COLUMNS) + '\n').encode())
+    return rows
+
+
+def _write_parquet(sink, batches):
+    import pyarrow.parquet as pq
+
+    rows = 0
+    with pq.ParquetWriter(sink, EXPORT_SCHEMA) as writer:
+        for df in batches:
+            writer.write_batch(_to_record_batch(df))
+            rows += len(df)
+    return rows
+
+
+def _write_arrow(sink, batches):
+    rows = 0
+    with pa.ipc.new_file(sink, EXPORT_SCHEMA) as writer:
+        for df in batches:
+            writer.write_batch(_to_record_batch(df))
+            rows += len(df)
+    return rows
+
+
+_WRITERS = {
+    'csv': _write_csv,
+    'parquet': _write_parquet,
+    'arrow': _write_arrow
+}
+
+
+def export_entries(sink, file_format, run_ids, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Streams the entries of the given runs into a binary file object or path.
+
+    Args:
+        sink: writable binary file object, or a path
+        file_format: 'csv', 'parquet' or 'arrow' (Arrow IPC file)
+        run_ids: runs to export
+        batch_size: rows fetched and written at a time
+
+    Returns:
+        number of rows written
+    """
+    if file_format not in _WRITERS:
+        raise ValueError(f"Unsupported export format: {file_format}")
+
+    if isinstance(sink, str):
+        with open(sink, 'wb') as file:
+            return export_entries(file, file_format, run_ids, batch_size)
+
+    return _WRITERS[file_format](sink, iter_entry_batches(run_ids, batch_size))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export hydro data entries to CSV, Parquet or Arrow IPC")
+    parser.add_argument("path")
+    runs = parser.add_mutually_exclusive_group(required=True)
+    runs.add_argument("--run-id", type=int, action="append", help="run to export, may be repeated")
+    runs.add_argument("--username", help="export every run of this user")
+    parser.add_argument("--format", choices=list(EXPORT_FORMATS), help="defaults to the file extension")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    file_format = args.format or next(
+        (name for name, (_, extension) in EXPORT_FORMATS.items() if args.path.endswith(extension)), 'csv')
+
+    init_db()
+    run_ids = args.run_id or get_run_ids(args.username)
+    rows = export_entries(args.path, file_format, run_ids, args.batch_size)
+    print(f"Exported {rows} entries from {len(run_ids)} runs to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import pandas as pd
+import streamlit as st
+from sqlalchemy import func, or_, select
+
+from db.database import get_db_session
+from db.query_cache import get_data_version
+from db.settings_store import get_settings
+from model.hydro_data_entry import HydroDataEntry, ENTRY_COLUMNS, get_entries_df_from_rows
+from model.hydro_run import HydroRun
+
+# Columns every incremental frame carries internally for patching and ordering
+_TRACKING_COLUMNS = ['id', 'date', 'updated_at']
+
+
+class IncrementalEntryFrame:
+    """
+    Keeps the last fetched entries of one run together with its high-water marks
+    (max id and max updated_at). A refresh only queries rows past those marks and
+    patches them into the kept frame instead of reloading the whole run.
+    """
+
+    def __init__(self, run_id, username, columns):
+        self.run_id = run_id
+        self.username = username
+        self.columns = list(columns)
+        self.query_columns = list(dict.fromkeys(_TRACKING_COLUMNS + self.columns))
+        self.frame = None
+        self.max_id = None
+        self.max_updated_at = None
+        self.data_version = None
+
+    def _base_query(self):
+        entry_table = HydroDataEntry.__table__
+        run_table = HydroRun.__table__
+        return (select(*(entry_table.c[col] for col in self.query_columns))
+                .join(run_table, entry_table.c.run_id == run_table.c.id)
+                .where(entry_table.c.run_id == self.run_id)
+                .where(run_table.c.username == self.username))
+
+    def _fetch(self, session, query):
+        df = get_entries_df_from_rows(session.execute(query), self.query_columns)
+        df.index = df['id'].to_numpy(dtype=int)
+        return df
+
+    def _update_marks(self, rows):
+        if rows.empty:
+            return
+        self.max_id = max(self.max_id or 0, int(rows['id'].max()))
+        latest_update = rows['updated_at'].max()
+        if pd.notna(latest_update) and (self.max_updated_at is None or latest_update > self.max_updated_at):
+            self.max_updated_at = latest_update
+
+    def _patch(self, rows):
+        """Overwrites already known rows in place and appends unseen ones"""
+        known_ids = rows.index.intersection(self.frame.index)
+        if len(known_ids):
+            self.frame.loc[known_ids, self.query_columns] = rows.loc[known_ids, self.query_columns]
+
+        new_ids = rows.index.difference(self.frame.index)
+        if len(new_ids):
+            self.frame = pd.concat([self.frame, rows.loc[new_ids]])
+
+        self.frame = self.frame.sort_values(['date', 'id'], kind='mergesort')
+
+    def _drop_deleted(self, session):
+        """Removes deleted rows, checking ids only when the row count no longer matches"""
+        entry_table = HydroDataEntry.__table__
+        row_count = session.execute(
+            select(func.count()).select_from(entry_table).where(entry_table.c.run_id == self.run_id)
+        ).scalar()
+        if row_count == len(self.frame):
+            return
+
+        existing_ids = set(session.execute(
+            select(entry_table.c.id).where(entry_table.c.run_id == self.run_id)
+        ).scalars())
+        self.frame = self.frame[self.frame.index.isin(existing_ids)]
+
+    def refresh(self):
+        """Brings the kept frame up to date and returns it with the requested columns"""
+        current_version = get_data_version()
+        if self.frame is not None and self.data_version == current_version:
+            return self.frame[self.columns].reset_index(drop=True)
+
+        entry_table = HydroDataEntry.__table__
+        with get_db_session() as session:
+            if self.frame is None:
+                query = self._base_query().order_by(entry_table.c.date.asc(), entry_table.c.id.asc())
+                self.frame = self._fetch(session, query)
+                self._update_marks(self.frame)
+            else:
+                if self.max_updated_at is not None:
+                    updated = entry_table.c.updated_at >= self.max_updated_at.to_pydatetime()
+                else:
+                    # No row carried an updated_at yet, so any stamped row is newer than the frame
+                    updated = entry_table.c.updated_at.is_not(None)
+                watermark = or_(entry_table.c.id > (self.max_id or 0), updated)
+                rows = self._fetch(session, self._base_query().where(watermark))
+                if not rows.empty:
+                    self._patch(rows)
+                    self._update_marks(rows)
+                self._drop_deleted(session)
+
+        self.data_version = current_version
+        return self.frame[self.columns].reset_index(drop=True)
+
+
+def get_incremental_entries_df(run_id=None, username=None, columns=None):
+    """
+    Session-scoped, incrementally refreshed entries of a run as a typed DataFrame.
+    Defaults to the current user and selected run, and to all entry columns.
+    """
+    if username is None or run_id is None:
+        settings = get_settings()
+        username = settings.username if username is None else username
+        run_id = settings.selected_run_id if run_id is None else run_id
+
+    columns = tuple(columns or ENTRY_COLUMNS)
+    frames = st.session_state.setdefault("incremental_entry_frames", {})
+    key = (username, run_id, columns)
+    if key not in frames:
+        frames[key] = IncrementalEntryFrame(run_id, username, columns)
+    return frames[key].refresh()
@@ -0,0 +1,139 @@
+"""
+Versioned, in-place schema migrations.
+
+`Base.metadata.create_all` only creates missing tables, so anything that changes an
+existing table (indexes, new columns, backfills) is added here as a numbered step.
+Steps must be idempotent because a fresh database already gets the current schema
+from create_all before the migrations run.
+"""
+import threading
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, String, Table, insert, inspect, select, text, update
+
+from db.database import Base
+from db.rollups import MEAN_COLUMNS, rebuild_rollups
+from model.data_version import DataVersion
+from model.hydro_data_entry import HydroDataEntry
+from model.hydro_run import HydroRun
+from model.hydro_run_rollup import HydroRunRollup
+from model.sensor_reading import SensorReading
+from model.sensor_rollup import SensorRollup
+from model.user_settings import UserSettingsRecord
+
+schema_migrations = Table(
+    "schema_migrations",
+    Base.metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+_migration_lock = threading.Lock()
+_migrated_engines = set()
+
+
+def _create_indexes(connection, *indexes):
+    for index in indexes:
+        index.create(connection, checkfirst=True)
+
+
+def add_query_indexes(connection):
+    _create_indexes(connection, *HydroDataEntry.__table__.indexes, *HydroRun.__table__.indexes)
+
+
+def _add_column(connection, table, column):
+    existing = {col['name'] for col in inspect(connection).get_columns(table.name)}
+    if column.name not in existing:
+        column_type = column.type.compile(dialect=connection.dialect)
+        connection.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+
+def add_entry_updated_at(connection):
+    _add_column(connection, HydroDataEntry.__table__, HydroDataEntry.__table__.c.updated_at)
+
+
+def backfill_run_rollups(connection):
+    HydroRunRollup.__table__.create(connection, checkfirst=True)
+    rebuild_rollups(connection)
+
+
+def add_user_settings(connection):
+    UserSettingsRecord.__table__.create(connection, checkfirst=True)
+
+
+def add_sensor_readings(connection):
+    SensorReading.__table__.create(connection, checkfirst=True)
+
+
+def add_sensor_rollups(connection):
+    SensorRollup.__table__.create(connection, checkfirst=True)
+
+
+def backfill_entry_updated_at(connection):
+    # Rows from before step 2 have no updated_at, which incremental loads can't track.
+    # Stamped with the app's clock rather than CURRENT_TIMESTAMP, which is UTC on SQLite
+    # and could sort after edits stamped with datetime.now()
+    entry_table = HydroDataEntry.__table__
+    connection.execute(update(entry_table)
+                       .where(entry_table.c.updated_at.is_(None))
+                       .values(updated_at=datetime.now()))
+
+
+def add_data_version(connection):
+    table = DataVersion.__table__
+    table.create(connection, checkfirst=True)
+    if connection.execute(select(table.c.id).where(table.c.id == 1)).first() is None:
+        connection.execute(insert(table).values(id=1, version=0))
+
+
+def add_rollup_reading_means(connection):
+    rollup_table = HydroRunRollup.__table__
+    for col in MEAN_COLUMNS:
+        _add_column(connection, rollup_table, rollup_table.c[f'{col}_mean'])
+    rebuild_rollups(connection)
+
+
+# (version, description, step) - append only, never renumber
+MIGRATIONS = [
+    (1, "Index entries on (run_id, date, id) and runs on (username, start_date)", add_query_indexes),
+    (2, "Add hydro_data_entry.updated_at for incremental loads", add_entry_updated_at),
+    (3, "Backfill hydro_run_rollup from existing entries", backfill_run_rollups),
+    (4, "Add user_settings for server-side settings", add_user_settings),
+    (5, "Add sensor_reading for probe telemetry", add_sensor_readings),
+    (6, "Add sensor_rollup tiers for probe telemetry", add_sensor_rollups),
+    (7, "Backfill hydro_data_entry.updated_at of rows from before step 2", backfill_entry_updated_at),
+    (8, "Add data_version shared by every process for cache invalidation", add_data_version),
+    (9, "Add light, water and environment means to hydro_run_rollup", add_rollup_reading_means),
+]
+
+
+def get_schema_version(connection):
+    query = select(schema_migrations.c.version).order_by(schema_migrations.c.version.desc())
+    return connection.execute(query).scalar() or 0
+
+
+def run_migrations(engine):
+    """Applies every migration newer than the database's schema version, one transaction each"""
+    with _migration_lock:
+        if engine.url in _migrated_engines:
+            return
+
+        schema_migrations.create(engine, checkfirst=True)
+
+        with engine.connect() as connection:
+            current_version = get_schema_version(connection)
+
+        for version, description, step in MIGRATIONS:
+            if version <= current_version:
+                continue
+
+            with engine.begin() as connection:
+                step(connection)
+                connection.execute(insert(schema_migrations).values(
+                    version=version,
+                    description=description,
+                    applied_at=datetime.now()
+                ))
+
+        _migrated_engines.add(engine.url)
@@ -0,0 +1,169 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+import pandas as pd
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import SQLAlchemyError
+
+# Entries older than this are reloaded even without a version bump, which covers
+# writes made directly in the database
+DEFAULT_TTL_SECONDS = 300.0
+
+# The shared data version is re-read from the database at most this often
+VERSION_POLL_SECONDS = 1.0
+
+
+class QueryCache:
+    """
+    Thread-safe LRU cache with hit/miss counters and an entry TTL.
+    Shared by all Streamlit sessions of the process.
+    """
+
+    def __init__(self, max_size=256, ttl=DEFAULT_TTL_SECONDS):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Returns (found, value) and marks the key as most recently used"""
+        with self._lock:
+            if key in self._entries:
+                stored_at, value = self._entries[key]
+                if self.ttl is None or time.monotonic() - stored_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        """Removes a single key, returning whether it was cached"""
+        with self._lock:
+            if key not in self._entries:
+                return False
+            del self._entries[key]
+            return True
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'data_version': get_data_version()
+            }
+
+
+# Shared version from the data_version table, plus a local counter so this process
+# sees its own writes immediately instead of after the next poll
+_version = {'shared': 0, 'local': 0, 'read_at': None}
+_version_lock = threading.Lock()
+
+query_cache = QueryCache()
+
+
+def _version_table():
+    from model.data_version import DataVersion
+
+    return DataVersion.__table__
+
+
+def _read_shared_version():
+    from db.database import conn
+
+    table = _version_table()
+    with conn.engine.connect() as connection:
+        return connection.execute(select(table.c.version).where(table.c.id == 1)).scalar() or 0
+
+
+def get_data_version():
+    """
+    Version cached reads are keyed on. Changes with every write of this process and,
+    within VERSION_POLL_SECONDS, with writes of other processes (CLI tools, replicas).
+    """
+    now = time.monotonic()
+    with _version_lock:
+        if _version['read_at'] is not None and now - _version['read_at'] < VERSION_POLL_SECONDS:
+            return _version['shared'], _version['local']
+        _version['read_at'] = now
+
+    try:
+        shared = _read_shared_version()
+    except SQLAlchemyError:
+        # Unreadable (e.g. database down), keep the last known version
+        shared = None
+
+    with _version_lock:
+        if shared is not None:
+            _version['shared'] = shared
+        return _version['shared'], _version['local']
+
+
+def bump_data_version(connection=None):
+    """
+    Call with every write so cached reads are reloaded on their next use, in every process.
+    Pass the write's connection or session to bump the shared version in the same transaction.
+    """
+    if connection is None:
+        from db.database import conn
+
+        with conn.engine.begin() as connection:
+            return bump_data_version(connection)
+
+    table = _version_table()
+    bumped = connection.execute(
+        update(table).where(table.c.id == 1).values(version=table.c.version + 1)).rowcount
+    if not bumped:
+        connection.execute(insert(table).values(id=1, version=1))
+
+    with _version_lock:
+        _version['local'] += 1
+        # Re-read on next use so this write's shared version is picked up after commit
+        _version['read_at'] = None
+        return _version['shared'], _version['local']
+
+
+def _copy_result(value):
+    if isinstance(value, pd.DataFrame):
+        return value.copy()
+    if isinstance(value, list):
+        return list(value)
+    if isinstance(value, tuple) and hasattr(value, '_fields'):
+        # NamedTuples such as EntryPage carry frames of their own
+        return value._make(_copy_result(item) for item in value)
+    return value
+
+
+def cached_query(func):
+    """
+    Caches a read function on its arguments plus the current data version.
+    Arguments must be hashable (username, run id, date range, ...).
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        key = (func.__qualname__, args, tuple(sorted(kwargs.items())), get_data_version())
+        found, value = query_cache.get(key)
+        if not found:
+            value = func(*args, **kwargs)
+            query_cache.set(key, value)
+        return _copy_result(value)
+
+    return wrapper
@@ -0,0 +1,155 @@
+from collections import defaultdict
+from datetime import timedelta
+
+import pandas as pd
+from sqlalchemy import delete, insert, select
+
+from db.query_cache import cached_query
+from db.database import get_db_session
+from model.hydro_data_entry import HydroDataEntry
+from model.hydro_run_rollup import HydroRunRollup
+
+ROLLUP_PERIODS = ('day', 'week')
+
+SUM_COLUMNS = ['ph_down_added', 'ph_up_added', 'hydro_vega_added', 'hydro_flora_added',
+               'boost_added', 'rhizotonic_added', 'water_added']
+
+MEAN_COLUMNS = ['light_hours', 'light_intensity', 'water_temp', 'water_level', 'humidity', 'air_temp']
+
+_SOURCE_COLUMNS = ['run_id', 'date', 'ph_initial', 'ec_initial', 'ph_final', 'ec_final'] + SUM_COLUMNS + MEAN_COLUMNS
+
+
+def get_period_start(day, period):
+    """Returns the first day of the rollup period containing day (weeks start on Monday)"""
+    return day if period == 'day' else day - timedelta(days=day.weekday())
+
+
+def _aggregate(entries, period):
+    """Aggregates entry rows into one rollup record per (run_id, period_start)"""
+    dates = pd.to_datetime(entries['date'])
+    if period == 'week':
+        dates = dates - pd.to_timedelta(dates.dt.weekday, unit='D')
+
+    grouped = entries.assign(period_start=dates.dt.date).groupby(['run_id', 'period_start'])
+    rollups = grouped.agg(
+        entry_count=('ph_final', 'size'),
+        ph_min=('ph_final', 'min'),
+        ph_max=('ph_final', 'max'),
+        ph_mean=('ph_final', 'mean'),
+        ec_min=('ec_final', 'min'),
+        ec_max=('ec_final', 'max'),
+        ec_mean=('ec_final', 'mean'),
+        ph_initial_mean=('ph_initial', 'mean'),
+        ec_initial_mean=('ec_initial', 'mean'),
+        **{f'{col}_mean': (col, 'mean') for col in MEAN_COLUMNS},
+        **{col: (col, 'sum') for col in SUM_COLUMNS}
+    ).reset_index()
+    return rollups.assign(period=period)
+
+
+def _write_rollups(connection, entries):
+    records = []
+    for period in ROLLUP_PERIODS:
+        rollups = _aggregate(entries, period).astype(object)
+        records.extend(rollups.where(rollups.notna(), None).to_dict('records'))
+    if records:
+        connection.execute(insert(HydroRunRollup.__table__), records)
+
+
+def _load_entries(connection, *conditions):
+    entry_table = HydroDataEntry.__table__
+    query = select(*(entry_table.c[col] for col in _SOURCE_COLUMNS)).where(*conditions)
+    return pd.DataFrame(connection.execute(query).all(), columns=_SOURCE_COLUMNS)
+
+
+def refresh_rollups(connection, affected_dates):
+    """
+    Recomputes the day and week rollups touched by a write.
+
+    Args:
+        connection: Session or Connection of the writing transaction, so the rollups
+            commit together with the entries
+        affected_dates: dict of run_id -> dates that were inserted, changed or deleted
+    """
+    entry_table = HydroDataEntry.__table__
+    rollup_table = HydroRunRollup.__table__
+
+    for run_id, dates in affected_dates.items():
+        dates = {day for day in dates if day is not None}
+        if not dates:
+            continue
+
+        # Whole weeks are recomputed, which also covers every affected day
+        first_day = get_period_start(min(dates), 'week')
+        last_day = get_period_start(max(dates), 'week') + timedelta(days=6)
+
+        connection.execute(delete(rollup_table)
+                           .where(rollup_table.c.run_id == run_id)
+                           .where(rollup_table.c.period_start.between(first_day, last_day)))
+
+        entries = _load_entries(connection,
+                                entry_table.c.run_id == run_id,
+                                entry_table.c.date.between(first_day, last_day))
+        _write_rollups(connection, entries)
+
+
+def rebuild_rollups(connection, run_ids=None):
+    """Recomputes all rollups, or those of the given runs, from hydro_data_entry"""
+    entry_table = HydroDataEntry.__table__
+    rollup_table = HydroRunRollup.__table__
+
+    delete_query = delete(rollup_table)
+    conditions = []
+    if run_ids is not None:
+        delete_query = delete_query.where(rollup_table.c.run_id.in_(run_ids))
+        conditions.append(entry_table.c.run_id.in_(run_ids))
+
+    connection.execute(delete_query)
+    _write_rollups(connection, _load_entries(connection, *conditions))
+
+
+def get_affected_dates(*frames):
+    """Collects run_id -> dates from entry frames (new, modified, original or deleted rows)"""
+    affected = defaultdict(set)
+    for frame in frames:
+        if frame.empty or 'run_id' not in frame.columns or 'date' not in frame.columns:
+            continue
+        rows = frame[frame['run_id'].notna() & frame['date'].notna()]
+        for run_id, day in zip(rows['run_id'].astype(int), pd.to_datetime(rows['date']).dt.date):
+            affected[run_id].add(day)
+    return affected
+
+
+@cached_query
+def get_rollups_df(run_id, period, start_date=None, end_date=None):
+    """Get the rollups of a run for one period ('day' or 'week'), ordered by period start"""
+    rollup_table = HydroRunRollup.__table__
+    query = (select(rollup_table)
+             .where(rollup_table.c.run_id == run_id)
+             .where(rollup_table.c.period == period)
+             .order_by(rollup_table.c.period_start.asc()))
+
+    if start_date:
+        query = query.where(rollup_table.c.period_start >= get_period_start(start_date, period))
+    if end_date:
+        query = query.where(rollup_table.c.period_start <= end_date)
+
+    with get_db_session() as session:
+        result = session.execute(query)
+        return pd.DataFrame(result.all(), columns=list(result.keys()))
+
+
+def get_rollup_entries_df(run_id, period, start_date=None, end_date=None):
+    """
+    Rollups shaped like an entries frame: `date` is the period start, readings are
+    period means and additives are period totals.
+    """
+    rollups = get_rollups_df(run_id, period, start_date, end_date)
+    return rollups.rename(columns={
+        'period_start': 'date',
+        'ph_mean': 'ph_final',
+        'ec_mean': 'ec_final',
+        'ph_initial_mean': 'ph_initial',
+        'ec_initial_mean': 'ec_initial',
+        **{f'{col}_mean': col for col in MEAN_COLUMNS}
+    })
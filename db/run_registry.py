@@ -0,0 +1,47 @@
+import streamlit as st
+
+from db.database_handler import get_run_summaries
+from db.query_cache import get_data_version
+from db.settings_store import get_settings
+
+
+class RunRegistry:
+    """
+    Run summaries of one user with an id -> run map, shared by every page of a
+    session and reloaded only when the data version changes.
+    """
+
+    def __init__(self, username):
+        self.username = username
+        self.runs = []
+        self.by_id = {}
+        self.positions = {}
+        self.data_version = None
+
+    def refresh(self):
+        current_version = get_data_version()
+        if self.data_version != current_version:
+            self.runs = get_run_summaries(self.username)
+            self.by_id = {run.id: run for run in self.runs}
+            self.positions = {run.id: position for position, run in enumerate(self.runs)}
+            self.data_version = current_version
+        return self
+
+    def get(self, run_id):
+        """Returns the run with this id, or None"""
+        return self.by_id.get(run_id)
+
+    def position(self, run_id, default=0):
+        """Position of a run in the list (for selectbox indexes), default if unknown"""
+        return self.positions.get(run_id, default)
+
+
+def get_run_registry(username=None):
+    """Returns the refreshed run registry of a user (defaults to the current user)"""
+    if username is None:
+        username = get_settings().username
+
+    registries = st.session_state.setdefault("run_registries", {})
+    if username not in registries:
+        registries[username] = RunRegistry(username)
+    return registries[username].refresh()
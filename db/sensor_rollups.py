@@ -0,0 +1,314 @@
+"""
+Compaction and retention of sensor readings.
+
+Raw readings are rolled up into minute buckets, minutes into hours and hours into
+days, each bucket keeping count, min, max, mean and last value. Every tier has its
+own retention, and chart loaders read the coarsest tier that still meets the
+requested resolution.
+
+Run once, or keep running with --interval:
+
+    python -m db.sensor_rollups --interval 60
+
+Retention can be changed per tier in .streamlit/secrets.toml, in days, where 0 keeps
+a tier forever:
+
+    [sensor_retention]
+    raw = 3
+    minute = 14
+"""
+import argparse
+import math
+import time
+from datetime import datetime, timedelta
+
+import pandas as pd
+import streamlit as st
+from sqlalchemy import delete, func, insert, select
+
+from db.database import conn, init_db
+from model.sensor_reading import SensorReading
+from model.sensor_rollup import SensorRollup
+
+TIERS = ('minute', 'hour', 'day')
+
+TIER_SECONDS = {'raw': 0, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+_TIER_FREQUENCIES = {'minute': 'min', 'hour': 'h', 'day': 'D'}
+
+# How long each tier is kept, None keeps it forever
+DEFAULT_RETENTION = {
+    'raw': timedelta(days=7),
+    'minute': timedelta(days=30),
+    'hour': timedelta(days=365),
+    'day': None
+}
+
+# Minutes this far back are recomputed on every run, so readings buffered by a probe still count
+LATE_READINGS_GRACE = timedelta(minutes=5)
+
+# Raw readings are compacted one window at a time to bound memory
+COMPACTION_WINDOW = timedelta(hours=1)
+
+# Upper bound on raw readings read for one chart, the most recent ones are kept
+MAX_RAW_READINGS = 200_000
+
+_GROUP_COLUMNS = ['run_id', 'sensor', 'metric', 'bucket_start']
+
+
+def get_retention():
+    """DEFAULT_RETENTION with the overrides of the [sensor_retention] secrets section"""
+    try:
+        overrides = dict(st.secrets.get("sensor_retention", {}))
+    except FileNotFoundError:
+        overrides = {}
+    retention = dict(DEFAULT_RETENTION)
+    for tier, days in overrides.items():
+        if tier in retention:
+            retention[tier] = timedelta(days=float(days)) if float(days) > 0 else None
+    return retention
+
+
+def floor_time(moment, tier):
+    return pd.Timestamp(moment).floor(_TIER_FREQUENCIES[tier]).to_pydatetime()
+
+
+def _write_rollups(connection, tier, rollups):
+    if rollups.empty:
+        return
+    rollups = rollups.assign(tier=tier).astype(object)
+    connection.execute(insert(SensorRollup.__table__), rollups.where(rollups.notna(), None).to_dict('records'))
+
+
+def _delete_buckets(connection, tier, start, end):
+    rollup_table = SensorRollup.__table__
+    connection.execute(delete(rollup_table)
+                       .where(rollup_table.c.tier == tier)
+                       .where(rollup_table.c.bucket_start >= start)
+                       .where(rollup_table.c.bucket_start < end))
+
+
+def _rollup_raw(connection, start, end):
+    """Rebuilds the minute buckets in [start, end) from raw readings"""
+    reading_table = SensorReading.__table__
+    columns = ['run_id', 'sensor', 'metric', 'value', 'recorded_at']
+    rows = connection.execute(
+        select(*(reading_table.c[col] for col in columns))
+        .where(reading_table.c.recorded_at >= start)
+        .where(reading_table.c.recorded_at < end)
+        .order_by(reading_table.c.recorded_at)
+    ).all()
+    readings = pd.DataFrame(rows, columns=columns)
+
+    _delete_buckets(connection, 'minute', start, end)
+    if readings.empty:
+        return
+
+    readings['bucket_start'] = pd.to_datetime(readings['recorded_at']).dt.floor('min')
+    rollups = readings.groupby(_GROUP_COLUMNS, dropna=False, sort=False).agg(
+        reading_count=('value', 'size'),
+        value_min=('value', 'min'),
+        value_max=('value', 'max'),
+        value_mean=('value', 'mean'),
+        value_last=('value', 'last')
+    ).reset_index()
+    _write_rollups(connection, 'minute', rollups)
+
+
+def _rollup_tier(connection, tier, source_tier, start, end):
+    """Rebuilds the buckets of tier in [start, end) from the finer source_tier"""
+    rollup_table = SensorRollup.__table__
+    columns = ['run_id', 'sensor', 'metric', 'bucket_start', 'reading_count',
+               'value_min', 'value_max', 'value_mean', 'value_last']
+    rows = connection.execute(
+        select(*(rollup_table.c[col] for col in columns))
+        .where(rollup_table.c.tier == source_tier)
+        .where(rollup_table.c.bucket_start >= start)
+        .where(rollup_table.c.bucket_start < end)
+        .order_by(rollup_table.c.bucket_start)
+    ).all()
+    source = pd.DataFrame(rows, columns=columns)
+
+    _delete_buckets(connection, tier, start, end)
+    if source.empty:
+        return
+
+    # Means are merged weighted by their reading counts
+    source['bucket_start'] = pd.to_datetime(source['bucket_start']).dt.floor(_TIER_FREQUENCIES[tier])
+    source['value_sum'] = source['value_mean'] * source['reading_count']
+    rollups = source.groupby(_GROUP_COLUMNS, dropna=False, sort=False).agg(
+        reading_count=('reading_count', 'sum'),
+        value_min=('value_min', 'min'),
+        value_max=('value_max', 'max'),
+        value_sum=('value_sum', 'sum'),
+        value_last=('value_last', 'last')
+    ).reset_index()
+    rollups['value_mean'] = rollups.pop('value_sum') / rollups['reading_count']
+    _write_rollups(connection, tier, rollups)
+
+
+def _compaction_start(connection):
+    """First minute to (re)compute: shortly before the last minute bucket, or the oldest reading"""
+    rollup_table = SensorRollup.__table__
+    reading_table = SensorReading.__table__
+
+    last_bucket = connection.execute(
+        select(func.max(rollup_table.c.bucket_start)).where(rollup_table.c.tier == 'minute')
+    ).scalar()
+    if last_bucket is not None:
+        start = floor_time(last_bucket, 'minute') + timedelta(minutes=1) - LATE_READINGS_GRACE
+    else:
+        oldest = connection.execute(select(func.min(reading_table.c.recorded_at))).scalar()
+        if oldest is None:
+            return None
+        start = floor_time(oldest, 'minute')
+    return start
+
+
+def apply_retention(connection, now, retention, compacted_until):
+    """Deletes readings and rollups past their tier's retention, returns the deleted row counts"""
+    reading_table = SensorReading.__table__
+    rollup_table = SensorRollup.__table__
+    deleted = {}
+
+    if retention.get('raw') is not None and compacted_until is not None:
+        # Raw readings are only dropped once their minute has been compacted, and never
+        # inside the grace period the next run recomputes from them
+        cutoff = min(now - retention['raw'], compacted_until - LATE_READINGS_GRACE)
+        deleted['raw'] = connection.execute(
+            delete(reading_table).where(reading_table.c.recorded_at < cutoff)
+        ).rowcount
+
+    for tier in TIERS:
+        if retention.get(tier) is not None:
+            deleted[tier] = connection.execute(
+                delete(rollup_table)
+                .where(rollup_table.c.tier == tier)
+                .where(rollup_table.c.bucket_start < now - retention[tier])
+            ).rowcount
+    return deleted
+
+
+def compact_sensor_readings(now=None, retention=None):
+    """
+    Rolls new raw readings up into every tier, then applies retention.
+    Only complete minutes are compacted; the current hour and day buckets are
+    partial and get rebuilt by the next run.
+
+    Returns:
+        dict of tier -> deleted row count
+    """
+    now = now or datetime.now()
+    retention = {**get_retention(), **(retention or {})}
+    end = floor_time(now, 'minute')
+
+    with conn.engine.connect() as connection:
+        start = _compaction_start(connection)
+
+    if start is not None and start < end:
+        window_start = start
+        while window_start < end:
+            window_end = min(window_start + COMPACTION_WINDOW, end)
+            with conn.engine.begin() as connection:
+                _rollup_raw(connection, window_start, window_end)
+            window_start = window_end
+
+        with conn.engine.begin() as connection:
+            _rollup_tier(connection, 'hour', 'minute', floor_time(start, 'hour'), end)
+            _rollup_tier(connection, 'day', 'hour', floor_time(start, 'day'), end)
+
+    with conn.engine.begin() as connection:
+        return apply_retention(connection, now, retention, end if start is not None else None)
+
+
+def select_tier(start, end, max_points, now=None, retention=None):
+    """
+    Coarsest tier whose buckets are no wider than (end - start) / max_points. When that
+    tier no longer holds data back to start, the finest tier that does is used instead.
+    """
+    now = now or datetime.now()
+    retention = {**get_retention(), **(retention or {})}
+    resolution = (end - start).total_seconds() / max(1, max_points)
+
+    def retains(tier):
+        return retention[tier] is None or start >= now - retention[tier]
+
+    finest_first = ('raw',) + TIERS
+    candidates = [tier for tier in finest_first if TIER_SECONDS[tier] <= resolution]
+    tier = candidates[-1]
+    if retains(tier):
+        return tier
+    return next((coarser for coarser in finest_first[finest_first.index(tier):] if retains(coarser)), 'day')
+
+
+def get_sensor_series(run_id, start, end, max_points, metrics=None, retention=None):
+    """
+    Sensor readings of a run between start and end from the tier picked by select_tier,
+    one row per timestamp with <metric>, <metric>_min and <metric>_max columns. Raw
+    readings are bucketed to the requested resolution, so dense probes still return
+    about max_points rows.
+
+    Returns:
+        (tier, DataFrame with a 'time' column)
+    """
+    tier = select_tier(start, end, max_points, retention=retention)
+
+    if tier == 'raw':
+        table = SensorReading.__table__
+        time_column, mean_column, min_column, max_column = (
+            table.c.recorded_at, table.c.value, table.c.value, table.c.value)
+        conditions = []
+    else:
+        table = SensorRollup.__table__
+        time_column, mean_column, min_column, max_column = (
+            table.c.bucket_start, table.c.value_mean, table.c.value_min, table.c.value_max)
+        conditions = [table.c.tier == tier]
+
+    query = (select(time_column.label('time'), table.c.metric,
+                    mean_column.label('mean'), min_column.label('min'), max_column.label('max'))
+             .where(table.c.run_id == run_id)
+             .where(time_column >= start)
+             .where(time_column <= end)
+             .where(*conditions))
+    if metrics:
+        query = query.where(table.c.metric.in_(metrics))
+    if tier == 'raw':
+        query = query.order_by(time_column.desc()).limit(MAX_RAW_READINGS)
+    else:
+        query = query.order_by(time_column)
+
+    with conn.engine.connect() as connection:
+        readings = pd.DataFrame(connection.execute(query).all(), columns=['time', 'metric', 'mean', 'min', 'max'])
+
+    if readings.empty:
+        return tier, pd.DataFrame(columns=['time'])
+
+    if tier == 'raw':
+        bucket_seconds = max(1, math.ceil((end - start).total_seconds() / max(1, max_points)))
+        readings['time'] = pd.to_datetime(readings['time']).dt.floor(f"{bucket_seconds}s")
+
+    # Several sensors measuring the same metric are merged per timestamp
+    wide = readings.pivot_table(index='time', columns='metric',
+                                values=['mean', 'min', 'max'],
+                                aggfunc={'mean': 'mean', 'min': 'min', 'max': 'max'})
+    wide.columns = [metric if stat == 'mean' else f"{metric}_{stat}" for stat, metric in wide.columns]
+    return tier, wide.reset_index()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Roll up and expire sensor readings")
+    parser.add_argument("--interval", type=float, help="keep running, compacting every INTERVAL seconds")
+    args = parser.parse_args(argv)
+
+    init_db()
+    while True:
+        started = time.perf_counter()
+        deleted = compact_sensor_readings()
+        print(f"Compacted in {time.perf_counter() - started:.1f}s, deleted {deleted}")
+        if args.interval is None:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+import json
+import time
+from dataclasses import dataclass, fields
+
+import streamlit as st
+from streamlit_local_storage import _st_local_storage
+
+from db.user_settings import (SETTINGS_FIELDS, get_default_settings, get_user_settings_version,
+                              load_user_settings, save_user_settings)
+
+# Minimum time between two write batches
+WRITE_DEBOUNCE_SECONDS = 1.0
+
+# Settings field -> local storage key
+STORAGE_KEYS = {
+    "username": "username",
+    "selected_run_id": "selected_run_id",
+    "nutrient_settings": "nutrient_recommendation_settings",
+    "nutrient_profiles": "nutrient_profiles",
+    "nutrient_products": "nutrient_products",
+    "system_types": "system_types"
+}
+
+_JSON_FIELDS = set(SETTINGS_FIELDS)
+
+_STATE_KEY = "settings_store"
+
+_LOAD_KEY = "settings_store_load"
+
+
+@dataclass
+class UserSettings:
+    """Parsed browser settings of the current session"""
+    username: str = None
+    selected_run_id: int = None
+    nutrient_settings: dict = None
+    nutrient_profiles: dict = None
+    nutrient_products: dict = None
+    system_types: dict = None
+
+
+def _parse_json(value):
+    if isinstance(value, dict):
+        return value
+    try:
+        parsed = json.loads(value)
+    except (TypeError, ValueError):
+        return None
+    return parsed if isinstance(parsed, dict) else None
+
+
+def _parse_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse(field, value):
+    if field in _JSON_FIELDS:
+        return _parse_json(value)
+    if field == "selected_run_id":
+        return _parse_int(value)
+    return value or None
+
+
+def _serialize(field, value):
+    if value is None:
+        return None
+    if field in _JSON_FIELDS:
+        return json.dumps(value, sort_keys=True)
+    return value
+
+
+class _SettingsState:
+    """
+    Settings object plus what was last written for it, kept in session state.
+    With a username, the SETTINGS_FIELDS live in the user_settings table and only
+    username and selected_run_id are kept in the browser.
+    """
+
+    def __init__(self, stored_items):
+        self.settings = UserSettings(**{
+            field: _parse(field, stored_items.get(key)) for field, key in STORAGE_KEYS.items()
+        })
+        self.persisted = {field: _serialize(field, getattr(self.settings, field)) for field in STORAGE_KEYS}
+        self.server_version = None
+        self.last_write = 0.0
+        self.write_count = 0
+
+        if self.settings.username:
+            self.load_server_settings()
+        else:
+            # Without a user, missing settings are seeded into the browser once
+            defaults = get_default_settings()
+            for field in SETTINGS_FIELDS:
+                if getattr(self.settings, field) is None:
+                    setattr(self.settings, field, defaults[field])
+
+    def load_server_settings(self):
+        """Replaces the SETTINGS_FIELDS with the user's server-side settings"""
+        # Settings found in the browser seed the server row of a user seen for the first time
+        seed = {field: getattr(self.settings, field) for field in SETTINGS_FIELDS}
+        self.server_version, server_settings = load_user_settings(self.settings.username, seed)
+        for field in SETTINGS_FIELDS:
+            setattr(self.settings, field, server_settings[field])
+            self.persisted[field] = _serialize(field, server_settings[field])
+
+    def changed_fields(self):
+        # Only fields with a persisted snapshot were loaded, anything else is never written back
+        return [f.name for f in fields(self.settings)
+                if f.name in self.persisted
+                and _serialize(f.name, getattr(self.settings, f.name)) != self.persisted[f.name]]
+
+    def is_server_field(self, field):
+        return field in _JSON_FIELDS and self.server_version is not None
+
+
+def _read_local_storage():
+    """All local storage items, or None while the browser has not answered yet"""
+    # LocalStorage() reads with default={}, which cannot be told apart from empty storage
+    return _st_local_storage(method="getAll", key=_LOAD_KEY, default=None)
+
+
+def _get_state():
+    state = st.session_state.get(_STATE_KEY)
+    if state is None:
+        # One getAll round trip per session, all values are parsed once here
+        stored_items = _read_local_storage()
+        if stored_items is None:
+            # First run of the session: the component reruns the script once the browser
+            # has sent its items. Nothing is cached or written from the placeholder result.
+            st.stop()
+        state = _SettingsState(stored_items)
+        st.session_state[_STATE_KEY] = state
+    return state
+
+
+def get_settings():
+    """
+    Returns the typed settings of the current session, flushing writes held back by the
+    debounce and picking up server-side settings saved from another session.
+    """
+    state = _get_state()
+    flush_settings()
+
+    pending = any(state.is_server_field(field) for field in state.changed_fields())
+    if state.server_version is not None and not pending:
+        if get_user_settings_version(state.settings.username) != state.server_version:
+            state.load_server_settings()
+    return state.settings
+
+
+def update_settings(**changes):
+    """Sets settings fields and writes the keys whose value actually changed"""
+    state = _get_state()
+    settings = state.settings
+    for field in changes:
+        if field not in STORAGE_KEYS:
+            raise AttributeError(f"Unknown setting: {field}")
+
+    username = changes.pop("username", settings.username)
+    if username != settings.username:
+        # Pending changes still belong to the previous user
+        flush_settings(force=True)
+        settings.username = username
+        if username:
+            state.load_server_settings()
+        else:
+            state.server_version = None
+
+    for field, value in changes.items():
+        setattr(settings, field, value)
+    flush_settings()
+
+
+def flush_settings(force=False):
+    """
+    Writes changed keys to the user_settings table or to browser local storage. Within
+    WRITE_DEBOUNCE_SECONDS of the previous write, changes are held back and go out with
+    a later flush instead.
+    """
+    state = _get_state()
+    changed = state.changed_fields()
+    if not changed:
+        return
+    if not force and time.monotonic() - state.last_write < WRITE_DEBOUNCE_SECONDS:
+        return
+
+    server_fields = [field for field in changed if state.is_server_field(field)]
+    if server_fields:
+        # The whole bundle is saved as one versioned blob
+        state.server_version = save_user_settings(
+            state.settings.username,
+            {field: getattr(state.settings, field) for field in SETTINGS_FIELDS}
+        )
+        for field in SETTINGS_FIELDS:
+            state.persisted[field] = _serialize(field, getattr(state.settings, field))
+
+    browser_fields = [field for field in changed if field not in server_fields]
+
+    # Component keys must be unique per script run, so every batch gets its own suffix
+    state.write_count += 1
+    for field in browser_fields:
+        value = _serialize(field, getattr(state.settings, field))
+        key = STORAGE_KEYS[field]
+        if value is None:
+            _st_local_storage(method="deleteItem", itemKey=key,
+                              key=f"settings_store_delete_{key}_{state.write_count}")
+        else:
+            _st_local_storage(method="setItem", itemKey=key, itemValue=value,
+                              key=f"settings_store_set_{key}_{state.write_count}")
+        state.persisted[field] = value
+    state.last_write = time.monotonic()
@@ -0,0 +1,302 @@
+"""
+Ingestion service for high-frequency probe readings.
+
+A small HTTP listener accepts line protocol on POST /write, buffers the readings in
+memory and a flush thread writes them to sensor_reading in batched inserts. It runs
+as its own process, so probe traffic never shares a thread with Streamlit sessions
+or the manual entry path.
+
+    python -m db.telemetry_ingest --port 8086
+
+It listens on localhost only unless a token is configured. Probes then send it as
+`Authorization: Token <token>`:
+
+    TELEMETRY_TOKEN=secret python -m db.telemetry_ingest --host 0.0.0.0
+
+Line protocol, one reading set per line, timestamp in nanoseconds and optional:
+
+    hydro,run_id=3,sensor=probe1 ph=6.12,ec=1.41,water_temp=20.5 1718000000000000000
+"""
+import argparse
+import hmac
+import ipaddress
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sqlalchemy import insert
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+from db.database import conn, init_db
+from model.sensor_reading import SensorReading
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8086
+DEFAULT_BATCH_SIZE = 5_000
+DEFAULT_FLUSH_INTERVAL_SECONDS = 1.0
+
+# Readings held in memory before new writes are refused with 503
+DEFAULT_MAX_BUFFERED = 500_000
+
+# Errors meaning the database could not be reached; the batch is kept and retried
+_UNAVAILABLE_ERRORS = (OperationalError, InterfaceError)
+
+
+class LineProtocolError(ValueError):
+    pass
+
+
+def _parse_tags(tag_section):
+    tags = {}
+    for pair in tag_section.split(',')[1:]:
+        key, _, value = pair.partition('=')
+        if not value:
+            raise LineProtocolError(f"Invalid tag: {pair!r}")
+        tags[key] = value
+    return tags
+
+
+def parse_line(line, received_at=None):
+    """Parses one line protocol line into reading records (one per field)"""
+    parts = line.split()
+    if len(parts) not in (2, 3):
+        raise LineProtocolError(f"Expected 'measurement[,tags] fields [timestamp]', got {line!r}")
+
+    tags = _parse_tags(parts[0])
+    if len(parts) == 3:
+        recorded_at = datetime.fromtimestamp(int(parts[2]) / 1e9)
+    else:
+        recorded_at = received_at or datetime.now()
+
+    run_id = int(tags['run_id']) if 'run_id' in tags else None
+    records = []
+    for field in parts[1].split(','):
+        metric, _, value = field.partition('=')
+        try:
+            value = float(value)
+        except ValueError:
+            raise LineProtocolError(f"Invalid field value: {field!r}")
+        records.append({
+            'run_id': run_id,
+            'sensor': tags.get('sensor'),
+            'metric': metric,
+            'value': value,
+            'recorded_at': recorded_at
+        })
+    return records
+
+
+class ReadingBuffer:
+    """In-memory buffer of reading records drained by a background flush thread"""
+
+    def __init__(self, batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL_SECONDS,
+                 max_buffered=DEFAULT_MAX_BUFFERED):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self.written = 0
+        self.dropped = 0
+        self.last_error = None
+        self._records = deque()
+        # Readings taken for the current flush still count against max_buffered, so a
+        # requeued batch never pushes the buffer past it
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._batch_ready = threading.Event()
+        self._worker = threading.Thread(target=self._run, name="telemetry-flush", daemon=True)
+
+    def start(self):
+        self._worker.start()
+        return self
+
+    def add(self, records):
+        """Buffers records, returns False without buffering when the buffer is full"""
+        with self._lock:
+            if len(self._records) + self._in_flight + len(records) > self.max_buffered:
+                return False
+            self._records.extend(records)
+            if len(self._records) >= self.batch_size:
+                self._batch_ready.set()
+        return True
+
+    def __len__(self):
+        return len(self._records)
+
+    def _take_batch(self):
+        with self._lock:
+            count = min(self.batch_size, len(self._records))
+            self._in_flight = count
+            return [self._records.popleft() for _ in range(count)]
+
+    def _finish_batch(self, requeue=None):
+        with self._lock:
+            if requeue:
+                self._records.extendleft(reversed(requeue))
+            self._in_flight = 0
+
+    @staticmethod
+    def _insert(batch):
+        # executemany; psycopg2 sends it as multi-row VALUES pages
+        with conn.engine.begin() as connection:
+            connection.execute(insert(SensorReading.__table__), batch)
+
+    def _write_isolating_rejects(self, batch):
+        """
+        Writes a batch the database rejected by splitting it in halves until the
+        offending readings are isolated; those are dropped. Returns the number written.
+        """
+        if len(batch) == 1:
+            try:
+                self._insert(batch)
+                return 1
+            except _UNAVAILABLE_ERRORS:
+                raise
+            except Exception as e:
+                self.last_error = e
+                self.dropped += 1
+                return 0
+
+        middle = len(batch) // 2
+        written = 0
+        for half in (batch[:middle], batch[middle:]):
+            try:
+                self._insert(half)
+                written += len(half)
+            except _UNAVAILABLE_ERRORS:
+                raise
+            except Exception:
+                written += self._write_isolating_rejects(half)
+        return written
+
+    def flush(self):
+        """
+        Writes one batch, returns the number of readings taken from the buffer. While the
+        database is unreachable the batch goes back into the buffer and the error is raised;
+        readings it rejects are dropped and counted so they can't stall ingestion.
+        """
+        batch = self._take_batch()
+        if not batch:
+            return 0
+        try:
+            self._insert(batch)
+            self.written += len(batch)
+            self.last_error = None
+        except _UNAVAILABLE_ERRORS:
+            self._finish_batch(requeue=batch)
+            raise
+        except Exception:
+            try:
+                self.written += self._write_isolating_rejects(batch)
+            except _UNAVAILABLE_ERRORS:
+                # Halves already written may be sent again, like any retried batch
+                self._finish_batch(requeue=batch)
+                raise
+        self._finish_batch()
+        return len(batch)
+
+    def _run(self):
+        retry_delay = self.flush_interval
+        while True:
+            try:
+                taken = self.flush()
+                retry_delay = self.flush_interval
+            except Exception as e:
+                self.last_error = e
+                time.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, 60.0)
+                continue
+
+            if taken < self.batch_size:
+                self._batch_ready.wait(self.flush_interval)
+                self._batch_ready.clear()
+
+
+def make_handler(buffer, token=None):
+    class TelemetryHandler(BaseHTTPRequestHandler):
+        def _reply(self, status, body=b""):
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != "/health":
+                self._reply(404)
+                return
+            error = f", last error: {buffer.last_error}" if buffer.last_error else ""
+            self._reply(200, f"buffered={len(buffer)} written={buffer.written} "
+                             f"dropped={buffer.dropped}{error}\n".encode())
+
+        def do_POST(self):
+            if self.path.split('?')[0] != "/write":
+                self._reply(404)
+                return
+            if token is not None and not hmac.compare_digest(
+                    self.headers.get("Authorization", ""), f"Token {token}"):
+                self._reply(401)
+                return
+
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+            received_at = datetime.now()
+            try:
+                records = [record
+                           for line in body.splitlines() if line.strip() and not line.startswith('#')
+                           for record in parse_line(line, received_at)]
+            except (LineProtocolError, ValueError) as e:
+                self._reply(400, f"{e}\n".encode())
+                return
+
+            if not buffer.add(records):
+                self._reply(503, b"buffer full\n")
+                return
+            self._reply(204)
+
+        def log_message(self, format, *args):
+            # Per-request logging would dominate at thousands of writes per second
+            pass
+
+    return TelemetryHandler
+
+
+def _is_loopback(host):
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sensor telemetry ingestion service")
+    parser.add_argument("--host", default=DEFAULT_HOST,
+                        help="interface to listen on, anything but localhost requires a token")
+    parser.add_argument("--token", default=os.environ.get("TELEMETRY_TOKEN"),
+                        help="token probes must send as 'Authorization: Token <token>' "
+                             "(default: $TELEMETRY_TOKEN)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--flush-interval", type=float, default=DEFAULT_FLUSH_INTERVAL_SECONDS)
+    args = parser.parse_args(argv)
+    if not args.token and not _is_loopback(args.host):
+        parser.error(f"refusing to listen on {args.host} without a token, set --token or TELEMETRY_TOKEN")
+
+    init_db()
+    buffer = ReadingBuffer(args.batch_size, args.flush_interval).start()
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(buffer, args.token or None))
+    print(f"Listening for line protocol on http://{args.host}:{args.port}/write")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        while len(buffer):
+            buffer.flush()
+
+
+if __name__ == "__main__":
+    main()
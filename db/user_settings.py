@@ -0,0 +1,175 @@
+import copy
+from datetime import datetime
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from db.database import get_db_session
+from db.query_cache import QueryCache
+from model.user_settings import UserSettingsRecord
+
+# Settings kept server-side, everything else stays in the browser
+SETTINGS_FIELDS = ("nutrient_settings", "nutrient_profiles", "nutrient_products", "system_types")
+
+DEFAULT_SETTINGS = {
+    "nutrient_profiles": {
+        "leafy_greens": {
+            "seedling": {"ph_target": 5.8, "ec_target": 0.8, "n": "low", "p": "low", "k": "low"},
+            "vegetative": {"ph_target": 5.8, "ec_target": 1.2, "n": "high", "p": "medium", "k": "medium"},
+            "harvest": {"ph_target": 5.8, "ec_target": 1.4, "n": "high", "p": "medium", "k": "medium"}
+        },
+        "fruiting": {
+            "seedling": {"ph_target": 5.8, "ec_target": 0.8, "n": "low", "p": "low", "k": "low"},
+            "vegetative": {"ph_target": 6.0, "ec_target": 1.5, "n": "high", "p": "medium", "k": "medium"},
+            "flowering": {"ph_target": 6.2, "ec_target": 2.0, "n": "medium", "p": "high", "k": "high"},
+            "fruiting": {"ph_target": 6.0, "ec_target": 2.2, "n": "low", "p": "high", "k": "high"}
+        },
+        "herbs": {
+            "seedling": {"ph_target": 5.6, "ec_target": 0.5, "n": "low", "p": "low", "k": "low"},
+            "vegetative": {"ph_target": 5.8, "ec_target": 1.0, "n": "medium", "p": "medium", "k": "medium"},
+            "harvest": {"ph_target": 5.8, "ec_target": 1.2, "n": "medium", "p": "medium", "k": "medium"}
+        }
+    },
+    "nutrient_products": {
+        "hydro_vega": {
+            "n": "high",
+            "p": "medium",
+            "k": "medium",
+            "ml_per_liter_light": 1.5,
+            "ml_per_liter_medium": 3.0,
+            "ml_per_liter_heavy": 4.5,
+            "stage": "vegetative"
+        },
+        "hydro_flora": {
+            "n": "low",
+            "p": "high",
+            "k": "high",
+            "ml_per_liter_light": 1.5,
+            "ml_per_liter_medium": 3.0,
+            "ml_per_liter_heavy": 4.5,
+            "stage": "flowering"
+        },
+        "boost": {
+            "n": "low",
+            "p": "high",
+            "k": "medium",
+            "ml_per_liter_light": 0.5,
+            "ml_per_liter_medium": 1.0,
+            "ml_per_liter_heavy": 2.0,
+            "stage": "flowering"
+        },
+        "rhizotonic": {
+            "n": "low",
+            "p": "low",
+            "k": "low",
+            "ml_per_liter_light": 1.0,
+            "ml_per_liter_medium": 2.0,
+            "ml_per_liter_heavy": 4.0,
+            "stage": "all"
+        }
+    },
+    "system_types": {
+        "dwc": {"description": "Deep Water Culture", "ec_modifier": 1.0, "change_frequency_days": 14},
+        "nft": {"description": "Nutrient Film Technique", "ec_modifier": 0.8, "change_frequency_days": 7},
+        "drip": {"description": "Drip System", "ec_modifier": 1.2, "change_frequency_days": 10},
+        "ebb_flow": {"description": "Ebb and Flow", "ec_modifier": 1.1, "change_frequency_days": 10}
+    },
+    "nutrient_settings": {
+        "enabled": True,
+        "system_type": "dwc",
+        "plant_type": "leafy_greens",
+        "growth_stage": "vegetative",
+        "ec_tolerance": 0.3,
+        "ph_tolerance": 0.3,
+        "aggressive_correction": False,
+        "auto_adjust": True,
+        "notification_frequency": "daily",
+        "water_volume_liters": 20
+    }
+}
+
+# username -> (version, settings), shared by all sessions and invalidated on save
+user_settings_cache = QueryCache(max_size=256)
+
+
+def get_default_settings():
+    """Fresh copy of the default settings bundle"""
+    return copy.deepcopy(DEFAULT_SETTINGS)
+
+
+def _with_defaults(settings):
+    merged = get_default_settings()
+    merged.update({field: value for field, value in settings.items()
+                   if field in SETTINGS_FIELDS and value is not None})
+    return merged
+
+
+def _load(username, seed=None):
+    found, cached = user_settings_cache.get(username)
+    if found:
+        return cached
+
+    table = UserSettingsRecord.__table__
+    try:
+        with get_db_session() as session:
+            row = session.execute(
+                select(table.c.version, table.c.settings).where(table.c.username == username)
+            ).first()
+            if row is None:
+                # First load of this user, seeded once from the given settings and the defaults
+                result = (1, _with_defaults(seed or {}))
+                session.execute(insert(table).values(
+                    username=username,
+                    version=result[0],
+                    settings=result[1],
+                    updated_at=datetime.now()
+                ))
+            else:
+                result = (row.version, _with_defaults(row.settings))
+    except IntegrityError:
+        # Another session seeded the same user concurrently
+        return _load(username)
+
+    user_settings_cache.set(username, result)
+    return result
+
+
+def load_user_settings(username, seed=None):
+    """
+    Returns (version, settings) of a user. A user without a row gets one, seeded from
+    seed (e.g. settings found in the browser) with the defaults filling the gaps.
+    The returned settings are a private copy the caller may modify.
+    """
+    version, settings = _load(username, seed)
+    return version, copy.deepcopy(settings)
+
+
+def get_user_settings_version(username):
+    """Current version of a user's settings, served from the process-wide cache"""
+    return _load(username)[0]
+
+
+def save_user_settings(username, settings):
+    """Stores the settings of a user, returning the new version"""
+    table = UserSettingsRecord.__table__
+    settings = _with_defaults(settings)
+
+    with get_db_session() as session:
+        result = session.execute(
+            update(table)
+            .where(table.c.username == username)
+            .values(version=table.c.version + 1, settings=settings, updated_at=datetime.now())
+        )
+        if result.rowcount == 0:
+            session.execute(insert(table).values(
+                username=username,
+                version=1,
+                settings=settings,
+                updated_at=datetime.now()
+            ))
+        version = session.execute(
+            select(table.c.version).where(table.c.username == username)
+        ).scalar()
+
+    user_settings_cache.pop(username)
+    return version
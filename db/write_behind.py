@@ -0,0 +1,255 @@
+"""
+Optional write-behind mode for new entries.
+
+Submissions are appended to a local SQLite journal and a background worker flushes
+them to the main database in batches, retrying with exponential backoff while the
+main database is unreachable. Entries survive a crash because they are committed to
+the journal before the form returns; they are removed from it only after the batch
+committed to the main database. A crash between those two commits re-sends that
+batch, so delivery is at-least-once.
+
+While the main database is unreachable nothing counts as a failed attempt. If a batch
+is rejected (constraint violation, unknown run), its entries are retried one at a
+time so the rest still go through. An entry that still fails after `max_attempts`
+tries is moved to the journal's dead_entries table and reported on the entry page.
+
+Enabled with a `[write_behind]` section in .streamlit/secrets.toml:
+
+    [write_behind]
+    enabled = true
+    journal_path = "write_behind_journal.db"
+    max_attempts = 5
+"""
+import json
+import sqlite3
+import threading
+import time
+from datetime import date, datetime
+
+import streamlit as st
+from sqlalchemy import insert
+from sqlalchemy.exc import InterfaceError, OperationalError
+
+from db.database import conn
+from db.query_cache import bump_data_version
+from db.rollups import refresh_rollups
+from model.hydro_data_entry import HydroDataEntry
+
+DEFAULT_JOURNAL_PATH = "write_behind_journal.db"
+DEFAULT_BATCH_SIZE = 100
+DEFAULT_FLUSH_INTERVAL_SECONDS = 1.0
+MAX_RETRY_DELAY_SECONDS = 60.0
+DEFAULT_MAX_ATTEMPTS = 5
+
+# Errors meaning the main database could not be reached, as opposed to rejecting the entries
+_UNAVAILABLE_ERRORS = (OperationalError, InterfaceError)
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def _encode_value(value):
+    return value.isoformat() if isinstance(value, date) else value
+
+
+def get_entry_record(entry):
+    """Column values of a new HydroDataEntry, without the database generated id and updated_at"""
+    return {column.name: getattr(entry, column.name)
+            for column in HydroDataEntry.__table__.columns
+            if column.name not in ('id', 'updated_at')}
+
+
+def _decode_record(payload):
+    record = json.loads(payload)
+    record['date'] = date.fromisoformat(record['date'])
+    return record
+
+
+class WriteBehindQueue:
+    """Durable journal of pending entries plus the worker thread that flushes it"""
+
+    def __init__(self, journal_path, batch_size=DEFAULT_BATCH_SIZE,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.journal_path = journal_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.last_error = None
+        self._wakeup = threading.Event()
+        self._journal_lock = threading.Lock()
+        self._journal = sqlite3.connect(journal_path, check_same_thread=False, isolation_level=None)
+        self._journal.execute("PRAGMA journal_mode=WAL")
+        self._journal.execute("PRAGMA synchronous=FULL")
+        self._journal.execute("""
+            CREATE TABLE IF NOT EXISTS pending_entries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                payload TEXT NOT NULL,
+                enqueued_at TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT
+            )
+        """)
+        self._journal.execute("""
+            CREATE TABLE IF NOT EXISTS dead_entries (
+                id INTEGER PRIMARY KEY,
+                payload TEXT NOT NULL,
+                enqueued_at TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                last_error TEXT,
+                failed_at TEXT NOT NULL
+            )
+        """)
+        self._worker = threading.Thread(target=self._run, name="write-behind-worker", daemon=True)
+        self._worker.start()
+
+    def enqueue(self, record):
+        """Appends one entry record to the journal and wakes the worker"""
+        payload = json.dumps({key: _encode_value(value) for key, value in record.items()})
+        with self._journal_lock:
+            self._journal.execute("INSERT INTO pending_entries (payload, enqueued_at) VALUES (?, ?)",
+                                  (payload, datetime.now().isoformat()))
+        self._wakeup.set()
+
+    def pending_count(self):
+        with self._journal_lock:
+            return self._journal.execute("SELECT COUNT(*) FROM pending_entries").fetchone()[0]
+
+    def retrying_count(self):
+        """Pending entries that were already rejected at least once"""
+        with self._journal_lock:
+            return self._journal.execute(
+                "SELECT COUNT(*) FROM pending_entries WHERE attempts > 0").fetchone()[0]
+
+    def dead_count(self):
+        """Entries given up on after max_attempts, kept in dead_entries for inspection"""
+        with self._journal_lock:
+            return self._journal.execute("SELECT COUNT(*) FROM dead_entries").fetchone()[0]
+
+    def _next_batch(self):
+        with self._journal_lock:
+            return self._journal.execute(
+                "SELECT id, payload FROM pending_entries ORDER BY id LIMIT ?", (self.batch_size,)
+            ).fetchall()
+
+    def _mark_failed(self, journal_id, error):
+        """Counts a rejected attempt, moving the entry to dead_entries once it has used them all"""
+        with self._journal_lock:
+            # The journal runs in autocommit mode, so the connection context manager only
+            # commits or rolls back the transaction opened by the explicit BEGIN
+            self._journal.execute("BEGIN")
+            with self._journal:
+                self._journal.execute(
+                    "UPDATE pending_entries SET attempts = attempts + 1, last_error = ? WHERE id = ?",
+                    (str(error), journal_id))
+                self._journal.execute("""
+                    INSERT INTO dead_entries (id, payload, enqueued_at, attempts, last_error, failed_at)
+                    SELECT id, payload, enqueued_at, attempts, last_error, ?
+                    FROM pending_entries WHERE id = ? AND attempts >= ?
+                """, (datetime.now().isoformat(), journal_id, self.max_attempts))
+                self._journal.execute("DELETE FROM pending_entries WHERE id = ? AND attempts >= ?",
+                                      (journal_id, self.max_attempts))
+
+    def _remove(self, journal_ids):
+        with self._journal_lock:
+            self._journal.executemany("DELETE FROM pending_entries WHERE id = ?",
+                                      [(journal_id,) for journal_id in journal_ids])
+
+    @staticmethod
+    def _write(records):
+        affected_dates = {}
+        for record in records:
+            affected_dates.setdefault(record['run_id'], set()).add(record['date'])
+
+        with conn.engine.begin() as connection:
+            connection.execute(insert(HydroDataEntry.__table__), records)
+            refresh_rollups(connection, affected_dates)
+            bump_data_version(connection)
+
+    def flush(self):
+        """
+        Writes one batch to the main database, returns the number of journal entries it
+        handled (written or counted as failed). Raises when the database is unreachable.
+        """
+        batch = self._next_batch()
+        if not batch:
+            return 0
+
+        now = datetime.now()
+        records = {}
+        for journal_id, payload in batch:
+            try:
+                records[journal_id] = {**_decode_record(payload), 'updated_at': now}
+            except (ValueError, TypeError, KeyError) as e:
+                self.last_error = e
+                self._mark_failed(journal_id, e)
+        if not records:
+            return len(batch)
+
+        try:
+            self._write(list(records.values()))
+            written_ids = list(records)
+        except _UNAVAILABLE_ERRORS:
+            raise
+        except Exception:
+            # The batch was rejected, find the offending entries so they can't hold back the rest
+            written_ids = []
+            for journal_id, record in records.items():
+                try:
+                    self._write([record])
+                    written_ids.append(journal_id)
+                except _UNAVAILABLE_ERRORS:
+                    self._remove(written_ids)
+                    raise
+                except Exception as e:
+                    self.last_error = e
+                    self._mark_failed(journal_id, e)
+
+        self._remove(written_ids)
+        return len(batch)
+
+    def _run(self):
+        retry_delay = self.flush_interval
+        while True:
+            try:
+                handled = self.flush()
+                if not self.retrying_count():
+                    self.last_error = None
+                retry_delay = self.flush_interval
+            except Exception as e:
+                # Database unreachable: back off without using up the entries' attempts
+                self.last_error = e
+                time.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, MAX_RETRY_DELAY_SECONDS)
+                continue
+
+            # Full batches mean more is waiting, otherwise sleep until the next submission
+            if handled < self.batch_size:
+                self._wakeup.wait(self.flush_interval)
+                self._wakeup.clear()
+
+
+def get_write_behind_config():
+    """The [write_behind] secrets section, empty when write-behind is not configured"""
+    try:
+        return dict(st.secrets.get("write_behind", {}))
+    except FileNotFoundError:
+        return {}
+
+
+def is_write_behind_enabled():
+    return bool(get_write_behind_config().get("enabled", False))
+
+
+def get_write_behind_queue():
+    """Returns the process-wide queue, starting its worker on first use"""
+    config = get_write_behind_config()
+    journal_path = config.get("journal_path", DEFAULT_JOURNAL_PATH)
+    with _queues_lock:
+        if journal_path not in _queues:
+            _queues[journal_path] = WriteBehindQueue(
+                journal_path,
+                batch_size=int(config.get("batch_size", DEFAULT_BATCH_SIZE)),
+                flush_interval=float(config.get("flush_interval_seconds", DEFAULT_FLUSH_INTERVAL_SECONDS)),
+                max_attempts=int(config.get("max_attempts", DEFAULT_MAX_ATTEMPTS))
+            )
+        return _queues[journal_path]
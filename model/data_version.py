@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer
+
+from db.database import Base
+
+
+class DataVersion(Base):
+    """Single row counter bumped with every write, so all processes see when cached reads are stale"""
+    __tablename__ = "data_version"
+
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<DataVersion(version={self.version})>"
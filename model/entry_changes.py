@@ -0,0 +1,131 @@
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+
+@dataclass
+class EntryChanges:
+    """
+    Result of comparing an edited entries DataFrame against the original one.
+
+    Existing rows are indexed by entry id. `changed_cells` is a boolean mask with the
+    same index as `modified_rows` that marks which cells differ from `original_rows`.
+    """
+    new_rows: pd.DataFrame = field(default_factory=pd.DataFrame)
+    modified_rows: pd.DataFrame = field(default_factory=pd.DataFrame)
+    original_rows: pd.DataFrame = field(default_factory=pd.DataFrame)
+    deleted_rows: pd.DataFrame = field(default_factory=pd.DataFrame)
+    changed_cells: pd.DataFrame = field(default_factory=pd.DataFrame)
+
+    @property
+    def deleted_ids(self):
+        return [int(entry_id) for entry_id in self.deleted_rows.index]
+
+    @property
+    def is_empty(self):
+        return self.new_rows.empty and self.modified_rows.empty and self.deleted_rows.empty
+
+
+def _index_by_id(df: pd.DataFrame) -> pd.DataFrame:
+    """Drops rows without an id and indexes the remaining rows by their integer id"""
+    if 'id' not in df.columns:
+        return pd.DataFrame(index=pd.Index([], dtype=int, name='id'))
+
+    existing = df[df['id'].notna()]
+    return existing.set_index(existing['id'].astype(int).rename('id')).drop(columns='id')
+
+
+def _column_changed(edited: pd.Series, original: pd.Series) -> pd.Series:
+    """Elementwise inequality that treats two missing values as equal"""
+    both_missing = edited.isna() & original.isna()
+    return ~((edited == original) | both_missing)
+
+
+def diff_entries(edited_df: pd.DataFrame, original_df: pd.DataFrame) -> EntryChanges:
+    """
+    Computes new, modified and deleted rows between two entries DataFrames in one
+    column-wise pass. Rows are matched on their `id` column, rows without an id are new.
+    """
+    value_columns = [col for col in edited_df.columns if col != 'id']
+
+    if 'id' in edited_df.columns:
+        new_rows = edited_df[edited_df['id'].isna()]
+    else:
+        new_rows = edited_df
+
+    edited = _index_by_id(edited_df)
+    original = _index_by_id(original_df)
+
+    common_ids = edited.index.intersection(original.index)
+    edited_common = edited.loc[common_ids, value_columns]
+    original_common = original.reindex(index=common_ids, columns=value_columns)
+
+    changed_cells = pd.DataFrame(
+        {col: _column_changed(edited_common[col], original_common[col]) for col in value_columns},
+        index=common_ids,
+        columns=value_columns,
+        dtype=bool
+    )
+    modified_ids = changed_cells.index[changed_cells.any(axis=1)]
+
+    return EntryChanges(
+        new_rows=new_rows,
+        modified_rows=edited_common.loc[modified_ids],
+        original_rows=original_common.loc[modified_ids],
+        deleted_rows=original.loc[original.index.difference(edited.index)],
+        changed_cells=changed_cells.loc[modified_ids]
+    )
+
+
+def _parse_editor_value(col: str, value):
+    """Editor deltas hold JSON values, dates arrive as ISO strings"""
+    if col == 'date' and isinstance(value, str):
+        return pd.to_datetime(value).date()
+    return value
+
+
+def changes_from_editor_state(editing_state: dict, original_df: pd.DataFrame) -> EntryChanges:
+    """
+    Builds EntryChanges from the delta st.data_editor keeps in session state
+    (edited_rows, added_rows, deleted_rows), touching only the rows named in it.
+    Row positions in the delta refer to positions in original_df.
+    """
+    editing_state = editing_state or {}
+    value_columns = [col for col in original_df.columns if col != 'id']
+    row_count = len(original_df)
+
+    deleted_positions = sorted({pos for pos in editing_state.get('deleted_rows', []) if pos < row_count})
+    edited_positions = {int(pos): values for pos, values in editing_state.get('edited_rows', {}).items()
+                        if int(pos) < row_count and int(pos) not in deleted_positions}
+
+    new_rows = pd.DataFrame(
+        [{col: _parse_editor_value(col, value) for col, value in row.items() if col in original_df.columns}
+         for row in editing_state.get('added_rows', [])],
+        columns=original_df.columns
+    )
+    # Empty rows added and left untouched are not entries yet
+    new_rows = new_rows.dropna(how='all', subset=value_columns)
+
+    original = _index_by_id(original_df.iloc[sorted(edited_positions)])
+    modified = original.copy()
+    for pos, values in edited_positions.items():
+        entry_id = int(original_df['id'].iat[pos])
+        for col, value in values.items():
+            if col in value_columns:
+                modified.at[entry_id, col] = _parse_editor_value(col, value)
+
+    changed_cells = pd.DataFrame(
+        {col: _column_changed(modified[col], original[col]) for col in value_columns},
+        index=modified.index,
+        columns=value_columns,
+        dtype=bool
+    )
+    modified_ids = changed_cells.index[changed_cells.any(axis=1)]
+
+    return EntryChanges(
+        new_rows=new_rows,
+        modified_rows=modified.loc[modified_ids, value_columns],
+        original_rows=original.loc[modified_ids, value_columns],
+        deleted_rows=_index_by_id(original_df.iloc[deleted_positions]),
+        changed_cells=changed_cells.loc[modified_ids]
+    )
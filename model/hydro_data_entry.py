@@ -1,6 +1,9 @@
 from pygments.lexer import default
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Column, Integer, Float, String, Date, Text, ForeignKey
+from datetime import datetime
+from typing import NamedTuple
+
+from sqlalchemy import Column, Integer, Float, String, Date, DateTime, Text, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from streamlit_sqlalchemy import StreamlitAlchemyMixin
 import streamlit as st
@@ -12,6 +15,9 @@ from model.hydro_run import HydroRun
 
 class HydroDataEntry(Base, StreamlitAlchemyMixin):
     __tablename__ = "hydro_data_entry"
+    __table_args__ = (
+        Index("ix_hydro_data_entry_run_date_id", "run_id", "date", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
     date = Column(Date, nullable=False)
@@ -35,6 +41,7 @@ class HydroDataEntry(Base, StreamlitAlchemyMixin):
     water_level = Column(Float, default=0)  # in cm from top
     humidity = Column(Float, default=0)  # in percentage
     air_temp = Column(Float, default=0)  # in Celsius
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)  # high-water mark for incremental loads
 
     run_id = Column(Integer, ForeignKey('hydro_run.id'), nullable=False)
 
@@ -67,6 +74,74 @@ class HydroDataEntry(Base, StreamlitAlchemyMixin):
 
         return result_df
 
+# Column order used by every entries DataFrame
+ENTRY_COLUMNS = [
+    'id', 'date', 'run_id',
+    'ph_initial', 'ec_initial', 'ph_final', 'ec_final',
+    'ph_down_added', 'ph_up_added', 'hydro_vega_added', 'hydro_flora_added', 'boost_added', 'rhizotonic_added',
+    'light_hours', 'light_intensity',
+    'other_actions', 'observations', 'comments',
+    'water_temp', 'water_added', 'water_level', 'humidity', 'air_temp'
+]
+
+# Explicit dtypes for entries DataFrames built straight from SQL rows.
+# `date` stays as datetime.date objects so the table editor keeps its date picker.
+ENTRY_DTYPES = {
+    'id': 'Int64',
+    'date': 'object',
+    'run_id': 'Int64',
+    'ph_initial': 'float64',
+    'ec_initial': 'float64',
+    'ph_final': 'float64',
+    'ec_final': 'float64',
+    'ph_down_added': 'float64',
+    'ph_up_added': 'float64',
+    'hydro_vega_added': 'float64',
+    'hydro_flora_added': 'float64',
+    'boost_added': 'float64',
+    'rhizotonic_added': 'float64',
+    'light_hours': 'Int64',
+    'light_intensity': 'Int64',
+    'other_actions': 'object',
+    'observations': 'object',
+    'comments': 'object',
+    'water_temp': 'float64',
+    'water_added': 'float64',
+    'water_level': 'float64',
+    'humidity': 'float64',
+    'air_temp': 'float64',
+    'updated_at': 'datetime64[ns]'
+}
+
+
+class EntryPage(NamedTuple):
+    """One keyset page of a run's entries, ordered by (date, id)"""
+    entries: pd.DataFrame
+    has_older: bool
+    has_newer: bool
+
+    @property
+    def first_key(self):
+        """(date, id) of the oldest entry on the page, the cursor for the previous page"""
+        if self.entries.empty:
+            return None
+        return self.entries['date'].iloc[0], int(self.entries['id'].iloc[0])
+
+    @property
+    def last_key(self):
+        """(date, id) of the newest entry on the page, the cursor for the next page"""
+        if self.entries.empty:
+            return None
+        return self.entries['date'].iloc[-1], int(self.entries['id'].iloc[-1])
+
+
+def get_entries_df_from_rows(rows, columns=None):
+    """Builds a typed entries DataFrame from an iterable of column tuples"""
+    columns = columns or ENTRY_COLUMNS
+    df = pd.DataFrame.from_records(rows, columns=columns)
+    return df.astype({col: ENTRY_DTYPES[col] for col in columns})
+
+
 def get_all_entries_df(entries):
     return pd.DataFrame([{
         'id': entry.id,
@@ -120,3 +195,24 @@ def get_entry_from_df(df):
         humidity=df['humidity'],
         air_temp=df['air_temp']
     )
+
+
+def to_db_value(value):
+    """Converts pandas/numpy scalars into plain Python values the DB driver understands"""
+    if value is None or (pd.api.types.is_scalar(value) and pd.isna(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.date()
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+def get_entry_records_from_df(df, include_id=False):
+    """Returns one plain dict per row, restricted to HydroDataEntry columns, for bulk statements"""
+    columns = [col for col in df.columns
+               if col in HydroDataEntry.__table__.columns and (include_id or col != 'id')]
+    return [
+        {col: to_db_value(value) for col, value in zip(columns, row)}
+        for row in df[columns].itertuples(index=False, name=None)
+    ]
@@ -1,10 +1,16 @@
-from sqlalchemy import Column, Integer, String, Date, Text
+from datetime import date
+from typing import NamedTuple, Optional
+
+from sqlalchemy import Column, Integer, String, Date, Text, Index
 from sqlalchemy.orm import relationship
 from db.database import Base
 from streamlit_sqlalchemy import StreamlitAlchemyMixin
 
 class HydroRun(Base, StreamlitAlchemyMixin):
     __tablename__ = "hydro_run"
+    __table_args__ = (
+        Index("ix_hydro_run_username_start_date", "username", "start_date"),
+    )
 
     id = Column(Integer, primary_key=True)
     name = Column(String, nullable=False)
@@ -16,4 +22,22 @@ class HydroRun(Base, StreamlitAlchemyMixin):
     entries = relationship("HydroDataEntry", back_populates="run")
 
     def __repr__(self):
-        return f"{self.name}: {self.start_date} - {self.end_date or 'In progress'}"
\ No newline at end of file
+        return f"{self.name}: {self.start_date} - {self.end_date or 'In progress'}"
+
+
+class RunSummary(NamedTuple):
+    """Lightweight, read-only view of a run used by the run selectors"""
+    id: int
+    name: str
+    start_date: date
+    end_date: Optional[date]
+    description: Optional[str]
+    entry_count: int
+    last_entry_date: Optional[date]
+    latest_ph: Optional[float]
+    latest_ec: Optional[float]
+
+    def __repr__(self):
+        return f"{self.name}: {self.start_date} - {self.end_date or 'In progress'}"
+
+    __str__ = __repr__
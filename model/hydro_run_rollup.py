@@ -0,0 +1,44 @@
+from sqlalchemy import Column, Integer, Float, String, Date, ForeignKey
+from streamlit_sqlalchemy import StreamlitAlchemyMixin
+
+from db.database import Base
+
+
+class HydroRunRollup(Base, StreamlitAlchemyMixin):
+    """Per-run daily and weekly aggregates of hydro_data_entry, maintained by db.rollups"""
+    __tablename__ = "hydro_run_rollup"
+
+    run_id = Column(Integer, ForeignKey('hydro_run.id'), primary_key=True)
+    period = Column(String, primary_key=True)  # 'day' or 'week'
+    period_start = Column(Date, primary_key=True)  # the day itself, or the Monday of the week
+    entry_count = Column(Integer, nullable=False)
+
+    # Statistics of the final (after actions) readings
+    ph_min = Column(Float)
+    ph_max = Column(Float)
+    ph_mean = Column(Float)
+    ec_min = Column(Float)
+    ec_max = Column(Float)
+    ec_mean = Column(Float)
+    ph_initial_mean = Column(Float)
+    ec_initial_mean = Column(Float)
+
+    # Means of the other readings, for long-range charts
+    light_hours_mean = Column(Float)
+    light_intensity_mean = Column(Float)
+    water_temp_mean = Column(Float)
+    water_level_mean = Column(Float)
+    humidity_mean = Column(Float)
+    air_temp_mean = Column(Float)
+
+    # Totals added during the period
+    ph_down_added = Column(Float, default=0)
+    ph_up_added = Column(Float, default=0)
+    hydro_vega_added = Column(Float, default=0)
+    hydro_flora_added = Column(Float, default=0)
+    boost_added = Column(Float, default=0)
+    rhizotonic_added = Column(Float, default=0)
+    water_added = Column(Float, default=0)  # in Liters
+
+    def __repr__(self):
+        return f"<HydroRunRollup(run_id={self.run_id}, period={self.period}, period_start={self.period_start})>"
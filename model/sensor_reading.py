@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, Index
+from streamlit_sqlalchemy import StreamlitAlchemyMixin
+
+from db.database import Base
+
+
+class SensorReading(Base, StreamlitAlchemyMixin):
+    """One timestamped probe value, written in batches by db.telemetry_ingest"""
+    __tablename__ = "sensor_reading"
+    __table_args__ = (
+        Index("ix_sensor_reading_run_metric_time", "run_id", "metric", "recorded_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    run_id = Column(Integer, ForeignKey('hydro_run.id'))
+    sensor = Column(String)  # device or probe name
+    metric = Column(String, nullable=False)  # e.g. 'ph', 'ec', 'water_temp', 'humidity'
+    value = Column(Float, nullable=False)
+    recorded_at = Column(DateTime, nullable=False)
+
+    def __repr__(self):
+        return f"<SensorReading(metric={self.metric}, value={self.value}, recorded_at={self.recorded_at})>"
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, Float, String, DateTime, ForeignKey, Index
+from streamlit_sqlalchemy import StreamlitAlchemyMixin
+
+from db.database import Base
+
+
+class SensorRollup(Base, StreamlitAlchemyMixin):
+    """Minute, hour and day aggregates of sensor_reading, maintained by db.sensor_rollups"""
+    __tablename__ = "sensor_rollup"
+    __table_args__ = (
+        Index("ix_sensor_rollup_tier_run_metric_bucket", "tier", "run_id", "metric", "bucket_start"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    tier = Column(String, nullable=False)  # 'minute', 'hour' or 'day'
+    run_id = Column(Integer, ForeignKey('hydro_run.id'))
+    sensor = Column(String)
+    metric = Column(String, nullable=False)
+    bucket_start = Column(DateTime, nullable=False)
+    reading_count = Column(Integer, nullable=False)
+    value_min = Column(Float)
+    value_max = Column(Float)
+    value_mean = Column(Float)
+    value_last = Column(Float)  # latest reading of the bucket
+
+    def __repr__(self):
+        return f"<SensorRollup(tier={self.tier}, metric={self.metric}, bucket_start={self.bucket_start})>"
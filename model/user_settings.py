@@ -0,0 +1,19 @@
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, String, DateTime, JSON
+from streamlit_sqlalchemy import StreamlitAlchemyMixin
+
+from db.database import Base
+
+
+class UserSettingsRecord(Base, StreamlitAlchemyMixin):
+    """Server-side settings of a user as one JSON blob, maintained by db.user_settings"""
+    __tablename__ = "user_settings"
+
+    username = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=1)  # incremented on every save
+    settings = Column(JSON, nullable=False)  # nutrient_settings, nutrient_profiles, nutrient_products, system_types
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    def __repr__(self):
+        return f"<UserSettingsRecord(username={self.username}, version={self.version})>"
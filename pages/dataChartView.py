@@ -1,33 +1,70 @@
 import streamlit as st
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-from streamlit_local_storage import LocalStorage
 
+from analytics.downsampling import DEFAULT_MAX_POINTS, filter_date_range, minmax_downsample, sum_downsample
+from analytics.figures import DEFAULT_WEBGL_THRESHOLD, cached_figure_json, scatter_class
+from analytics.series import interleave_before_after
+from components.plotly_spec_chart import plotly_spec_chart
 from components.run_selector import run_selector
-from db.database_handler import get_all_entries
+from db.incremental_loader import get_incremental_entries_df
+from db.rollups import get_rollup_entries_df
+from db.sensor_rollups import get_sensor_series
 from model.hydro_run import HydroRun
-from pages.dataEntry import selected_run
 
 st.set_page_config(layout="wide")
 
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
 import plotly.express as px
 
 
+# Columns the charts actually read, so the loader skips the free-text fields
+CHART_COLUMNS = [
+    'date', 'ph_initial', 'ec_initial', 'ph_final', 'ec_final',
+    'ph_down_added', 'ph_up_added', 'hydro_vega_added', 'hydro_flora_added', 'boost_added', 'rhizotonic_added',
+    'light_hours', 'light_intensity', 'water_temp', 'water_added', 'water_level', 'humidity', 'air_temp'
+]
+
+# Value columns of each chart, used to keep their extremes when downsampling
+EC_SERIES = ['ec_initial', 'ec_final']
+PH_SERIES = ['ph_initial', 'ph_final']
+SUBSTANCE_SERIES = ['ph_down_added', 'ph_up_added', 'hydro_vega_added',
+                    'hydro_flora_added', 'boost_added', 'rhizotonic_added']
+LIGHT_SERIES = ['light_hours', 'light_intensity']
+WATER_SERIES = ['water_temp', 'water_level', 'water_added']
+ENVIRONMENT_SERIES = ['humidity', 'air_temp']
+
+# Date ranges longer than this are read from the rollup table: additives as weekly
+# totals, every other chart as daily means and totals
+ROLLUP_MIN_DAYS = 90
+
+# Probe metrics shown in the sensor chart, one subplot each
+SENSOR_METRICS = {'ph': 'pH', 'ec': 'EC', 'water_temp': 'Water Temp (°C)', 'humidity': 'Humidity (%)'}
+
+SENSOR_WINDOWS = {
+    'Last hour': timedelta(hours=1),
+    'Last 24 hours': timedelta(days=1),
+    'Last 7 days': timedelta(days=7),
+    'Last 30 days': timedelta(days=30),
+    'Last year': timedelta(days=365)
+}
+
+
+def plot_ph_chart(df, webgl_threshold=DEFAULT_WEBGL_THRESHOLD):
+    scatter = scatter_class(len(df), webgl_threshold)
 
-def plot_ph_chart(df):
     fig = go.Figure()
 
     # Add initial and final pH lines
-    fig.add_trace(go.Scatter(
+    fig.add_trace(scatter(
         x=df['date'],
         y=df['ph_initial'],
         name='Initial pH',
         line=dict(color='blue')
     ))
 
-    fig.add_trace(go.Scatter(
+    fig.add_trace(scatter(
         x=df['date'],
         y=df['ph_final'],
         name='Final pH',
@@ -35,13 +72,9 @@ def plot_ph_chart(df):
     ))
 
     # Create combined timeline
-    combined_dates = []
-    combined_ph = []
-    for _, row in df.iterrows():
-        combined_dates.extend([row['date'], row['date']])
-        combined_ph.extend([row['ph_initial'], row['ph_final']])
+    combined_dates, combined_ph = interleave_before_after(df, 'ph_initial', 'ph_final')
 
-    fig.add_trace(go.Scatter(
+    fig.add_trace(scatter(
         x=combined_dates,
         y=combined_ph,
         name='Daily Progress',
@@ -66,18 +99,20 @@ def plot_ph_chart(df):
     return fig
 
 
-def plot_ec_chart(df):
+def plot_ec_chart(df, webgl_threshold=DEFAULT_WEBGL_THRESHOLD):
+    scatter = scatter_class(len(df), webgl_threshold)
+
     fig = go.Figure()
 
     # Add initial and final EC lines
-    fig.add_trace(go.Scatter(
+    fig.add_trace(scatter(
         x=df['date'],
         y=df['ec_initial'],
         name='Initial EC',
         line=dict(color='blue')
     ))
 
-    fig.add_trace(go.Scatter(
+    fig.add_trace(scatter(
         x=df['date'],
         y=df['ec_final'],
         name='Final EC',
@@ -85,13 +120,9 @@ def plot_ec_chart(df):
     ))
 
     # Create combined timeline
-    combined_dates = []
-    combined_ec = []
-    for _, row in df.iterrows():
-        combined_dates.extend([row['date'], row['date']])
-        combined_ec.extend([row['ec_initial'], row['ec_final']])
+    combined_dates, combined_ec = interleave_before_after(df, 'ec_initial', 'ec_final')
 
-    fig.add_trace(go.Scatter(
+    fig.add_trace(scatter(
         x=combined_dates,
         y=combined_ec,
         name='Daily Progress',
@@ -168,17 +199,20 @@ def plot_substances_added(df):
     return fig
 
 
-def plot_light_metrics(df):
+def plot_light_metrics(df, webgl_threshold=DEFAULT_WEBGL_THRESHOLD):
     """
     Creates a plot showing light hours as an area chart and light intensity as a line
     over time. Missing values are forward-filled with the last known value.
 
     Parameters:
         df (pandas.DataFrame): DataFrame with columns 'date', 'light_hours', and 'light_intensity'
+        webgl_threshold (int): Point count above which the traces are drawn with WebGL
 
     Returns:
         plotly.graph_objects.Figure: The configured plot
     """
+    scatter = scatter_class(len(df), webgl_threshold)
+
     # Create a copy of the dataframe and forward fill missing values
     df_filled = df.copy()
     df_filled['light_hours'] = df_filled['light_hours'].ffill()
@@ -189,7 +223,7 @@ def plot_light_metrics(df):
 
     # Add light hours as area
     fig.add_trace(
-        go.Scatter(
+        scatter(
             x=df_filled['date'],
             y=df_filled['light_hours'],
             name='Light Hours',
@@ -203,7 +237,7 @@ def plot_light_metrics(df):
 
     # Add light intensity as line
     fig.add_trace(
-        go.Scatter(
+        scatter(
             x=df_filled['date'],
             y=df_filled['light_intensity'],
             name='Light Intensity',
@@ -268,7 +302,9 @@ def plot_light_metrics(df):
     return fig
 
 
-def plot_water_metrics(df):
+def plot_water_metrics(df, webgl_threshold=DEFAULT_WEBGL_THRESHOLD):
+    scatter = scatter_class(len(df), webgl_threshold)
+
     # Create three subplots for water metrics
     fig = make_subplots(
         rows=3, cols=1,
@@ -277,14 +313,14 @@ def plot_water_metrics(df):
 
     # Water Temperature
     fig.add_trace(
-        go.Scatter(x=df['date'], y=df['water_temp'], name='Temperature (°C)',
+        scatter(x=df['date'], y=df['water_temp'], name='Temperature (°C)',
                    line=dict(color='red')),
         row=1, col=1
     )
 
     # Water Level
     fig.add_trace(
-        go.Scatter(x=df['date'], y=df['water_level'], name='Level (cm)',
+        scatter(x=df['date'], y=df['water_level'], name='Level (cm)',
                    line=dict(color='blue')),
         row=2, col=1
     )
@@ -305,12 +341,14 @@ def plot_water_metrics(df):
     return fig
 
 
-def plot_environment_metrics(df):
+def plot_environment_metrics(df, webgl_threshold=DEFAULT_WEBGL_THRESHOLD):
+    scatter = scatter_class(len(df), webgl_threshold)
+
     fig = make_subplots(specs=[[{"secondary_y": True}]])
 
     # Add humidity line
     fig.add_trace(
-        go.Scatter(
+        scatter(
             x=df['date'],
             y=df['humidity'],
             name='Humidity (%)',
@@ -321,7 +359,7 @@ def plot_environment_metrics(df):
 
     # Add temperature line
     fig.add_trace(
-        go.Scatter(
+        scatter(
             x=df['date'],
             y=df['air_temp'],
             name='Temperature (°C)',
@@ -341,42 +379,151 @@ def plot_environment_metrics(df):
     return fig
 
 
-def display_charts(df):
-    """Main function to display all charts"""
-    st.title('Hydroponic System Analytics')
+def plot_sensor_readings(df, webgl_threshold=DEFAULT_WEBGL_THRESHOLD):
+    """Mean of every probe metric with its min/max band, one row per metric"""
+    metrics = [metric for metric in SENSOR_METRICS if metric in df.columns]
+    scatter = scatter_class(len(df), webgl_threshold)
+
+    fig = make_subplots(rows=len(metrics), cols=1, shared_xaxes=True,
+                        subplot_titles=[SENSOR_METRICS[metric] for metric in metrics])
+    for row, metric in enumerate(metrics, start=1):
+        if f'{metric}_min' in df.columns:
+            fig.add_trace(scatter(x=df['time'], y=df[f'{metric}_max'], mode='lines',
+                                  line=dict(width=0), showlegend=False, hoverinfo='skip'), row=row, col=1)
+            fig.add_trace(scatter(x=df['time'], y=df[f'{metric}_min'], mode='lines',
+                                  line=dict(width=0), fill='tonexty', fillcolor='rgba(0, 0, 255, 0.15)',
+                                  showlegend=False, hoverinfo='skip'), row=row, col=1)
+        fig.add_trace(scatter(x=df['time'], y=df[metric], mode='lines', name=SENSOR_METRICS[metric],
+                              line=dict(color='blue')), row=row, col=1)
+
+    fig.update_layout(title='Sensor Readings', height=250 * max(1, len(metrics)), hovermode='x unified')
+    return fig
+
+
+def display_sensor_chart(run_id, max_points, webgl_threshold):
+    """Probe readings of the run from the coarsest rollup tier that fits the point budget"""
+    window = st.sidebar.selectbox('Sensor window', options=list(SENSOR_WINDOWS), index=1)
+    end = datetime.now()
+    tier, sensor_df = get_sensor_series(run_id, end - SENSOR_WINDOWS[window], end, max_points,
+                                        metrics=list(SENSOR_METRICS))
+    if sensor_df.empty:
+        return
+
+    series = [col for col in sensor_df.columns if col != 'time']
+    chart_section(f'Sensor Readings ({tier})', plot_sensor_readings, series, sensor_df, max_points,
+                  {'webgl_threshold': webgl_threshold}, False)
+
 
-    # EC Chart
-    st.subheader('EC Levels')
-    st.plotly_chart(plot_ec_chart(df), use_container_width=True)
+def select_chart_window(df):
+    """
+    Sidebar controls for the visible date range and the number of points per series.
+    Returns the rows inside the selected range and the point budget.
+    """
+    st.sidebar.subheader('Chart Range')
+    max_points = st.sidebar.select_slider(
+        'Points per series',
+        options=[250, 500, 1000, 2000, 5000],
+        value=DEFAULT_MAX_POINTS,
+        help='Longer ranges are reduced to this many points while keeping highs and lows. '
+             'Narrow the date range to see every reading.'
+    )
 
-    # pH Chart
-    st.subheader('pH Levels')
-    st.plotly_chart(plot_ph_chart(df), use_container_width=True)
+    if df.empty or df['date'].min() == df['date'].max():
+        return df, max_points
 
-    # Substances Added
-    st.subheader('Nutrients and Additives')
-    st.plotly_chart(plot_substances_added(df), use_container_width=True)
+    start_date, end_date = st.sidebar.slider(
+        'Date range',
+        min_value=df['date'].min(),
+        max_value=df['date'].max(),
+        value=(df['date'].min(), df['date'].max())
+    )
+    return filter_date_range(df, start_date, end_date), max_points
 
-    # Light Metrics
-    st.subheader('Light Metrics')
-    st.plotly_chart(plot_light_metrics(df), use_container_width=True)
 
-    # Water Metrics
-    st.subheader('Water Metrics')
-    st.plotly_chart(plot_water_metrics(df), use_container_width=True)
+def select_render_mode():
+    """Sidebar control for the point count above which charts switch to WebGL"""
+    return st.sidebar.number_input(
+        'WebGL above (points)',
+        min_value=0,
+        value=DEFAULT_WEBGL_THRESHOLD,
+        step=250,
+        help='Charts over ranges with more entries than this are drawn with WebGL instead of SVG.'
+    )
 
-    # Environment Metrics
-    st.subheader('Environmental Conditions')
-    st.plotly_chart(plot_environment_metrics(df), use_container_width=True)
+
+# (title, plot function, value columns, draws scatter traces, open on first load, downsampling)
+# Additive amounts are drawn as bars, so they are summed per bucket instead of thinned out
+CHART_SECTIONS = [
+    ('EC Levels', plot_ec_chart, EC_SERIES, True, True, minmax_downsample),
+    ('pH Levels', plot_ph_chart, PH_SERIES, True, False, minmax_downsample),
+    ('Nutrients and Additives', plot_substances_added, SUBSTANCE_SERIES, False, False, sum_downsample),
+    ('Light Metrics', plot_light_metrics, LIGHT_SERIES, True, False, minmax_downsample),
+    ('Water Metrics', plot_water_metrics, WATER_SERIES, True, False, minmax_downsample),
+    ('Environmental Conditions', plot_environment_metrics, ENVIRONMENT_SERIES, True, False, minmax_downsample),
+]
+
+
+@st.fragment
+def chart_section(title, plot_function, series, df, max_points, options, expanded, downsample=minmax_downsample):
+    """
+    One chart behind a toggle. The figure is only built while the section is open, and
+    toggling it reruns just this fragment instead of the whole page.
+    """
+    if not st.toggle(title, value=expanded, key=f"chart_section_{plot_function.__name__}"):
+        return
+
+    # WebGL is chosen on the size of the range, not of the already downsampled frame,
+    # which is about max_points rows and would hardly ever cross the threshold
+    webgl_threshold = options.get('webgl_threshold')
+    if webgl_threshold is not None and len(df) > webgl_threshold:
+        options = {**options, 'webgl_threshold': 0}
+
+    spec = cached_figure_json(plot_function, downsample(df, series, max_points), **options)
+    plotly_spec_chart(spec)
+
+
+def load_rollups(run_id, df):
+    """
+    Daily and weekly rollups for ranges longer than ROLLUP_MIN_DAYS, otherwise None.
+
+    Returns:
+        (daily rollups, weekly rollups) shaped like entry frames, or None
+    """
+    if df.empty or (df['date'].max() - df['date'].min()).days <= ROLLUP_MIN_DAYS:
+        return None
+    start_date, end_date = df['date'].min(), df['date'].max()
+    return (get_rollup_entries_df(run_id, 'day', start_date, end_date),
+            get_rollup_entries_df(run_id, 'week', start_date, end_date))
+
+
+def display_charts(df, max_points=DEFAULT_MAX_POINTS, webgl_threshold=DEFAULT_WEBGL_THRESHOLD, rollups=None):
+    """
+    Main function to display all charts.
+    When rollups are given the charts read them instead of the entries: the additives
+    chart shows weekly totals and the others one point per day.
+    """
+    st.title('Hydroponic System Analytics')
+
+    for title, plot_function, series, has_scatter, expanded, downsample in CHART_SECTIONS:
+        options = {'webgl_threshold': webgl_threshold} if has_scatter else {}
+        section_df = df
+        if rollups is not None:
+            daily_df, weekly_df = rollups
+            if plot_function is plot_substances_added:
+                title, section_df = f'{title} (weekly totals)', weekly_df
+            else:
+                title, section_df = f'{title} (daily)', daily_df
+        chart_section(title, plot_function, series, section_df, max_points, options, expanded, downsample)
 
 
 if __name__ == "__main__":
     # Assuming you have your data loading logic here
-    from model.hydro_data_entry import get_all_entries_df, HydroDataEntry
-    from db.database import init_db
-
-    init_db()
     selected_run = run_selector()
 
-    all_entries = get_all_entries_df(get_all_entries())
-    display_charts(all_entries)
\ No newline at end of file
+    all_entries = get_incremental_entries_df(columns=CHART_COLUMNS)
+    visible_entries, max_points = select_chart_window(all_entries)
+    webgl_threshold = select_render_mode()
+    rollups = load_rollups(selected_run.id, visible_entries) if selected_run else None
+    display_charts(visible_entries, max_points, webgl_threshold, rollups)
+    if selected_run:
+        display_sensor_chart(selected_run.id, max_points, webgl_threshold)
\ No newline at end of file
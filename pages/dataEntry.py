@@ -4,10 +4,12 @@ import pandas as pd
 
 from components.run_selector import run_selector
 from db.database_handler import get_last_entry
+from db.query_cache import bump_data_version
+from db.rollups import refresh_rollups
+from db.write_behind import get_entry_record, get_write_behind_queue, is_write_behind_enabled
 from model.hydro_data_entry import HydroDataEntry
 from model.hydro_run import HydroRun
-from db.database import conn, init_db
-init_db()
+from db.database import conn
 
 st.set_page_config(layout="centered")
 
@@ -68,9 +70,19 @@ def submit_data(data):
                 humidity=float(data[19]),
             )
 
+        # In write-behind mode the entry is journaled locally and flushed in the background
+        if is_write_behind_enabled():
+            get_write_behind_queue().enqueue(get_entry_record(measurement))
+            st.success('Entry has been queued and will be written to the database shortly', icon="✅")
+            st.write(measurement.__df__())
+            return
+
         # Save to database
         with conn.session as session:
             session.add(measurement)
+            session.flush()
+            refresh_rollups(session, {measurement.run_id: {measurement.date}})
+            bump_data_version(session)
             session.commit()
 
             # Show success message
@@ -83,6 +95,19 @@ def submit_data(data):
         return None
 
 measure_only_mode = st.toggle("Measure only mode", value=True)
+
+if is_write_behind_enabled():
+    write_behind_queue = get_write_behind_queue()
+    pending_entries = write_behind_queue.pending_count()
+    dead_entries = write_behind_queue.dead_count()
+    if dead_entries:
+        st.error(f"{dead_entries} queued entries could not be written and were set aside in "
+                 f"{write_behind_queue.journal_path} (dead_entries)")
+    if write_behind_queue.last_error is not None:
+        st.warning(f"{pending_entries} queued entries waiting, last write failed: {write_behind_queue.last_error}")
+    elif pending_entries:
+        st.info(f"{pending_entries} queued entries waiting to be written")
+
 selected_run = run_selector()
 
 with st.form(key='dataEntryForm'):
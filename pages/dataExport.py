@@ -0,0 +1,55 @@
+import tempfile
+from datetime import date
+
+import streamlit as st
+
+from db.export import EXPORT_FORMATS, export_entries
+from db.run_registry import get_run_registry
+
+ALL_RUNS = "all"
+
+
+def select_runs(run_registry):
+    """Returns the ids of the runs to export, a single run or all runs of the user"""
+    choice = st.selectbox(
+        "Runs",
+        options=[ALL_RUNS] + list(run_registry.by_id),
+        format_func=lambda option: "All my runs" if option == ALL_RUNS else str(run_registry.get(option))
+    )
+    return list(run_registry.by_id) if choice == ALL_RUNS else [choice]
+
+
+def main():
+    """
+    Export page. The rows are streamed into a temporary file, but st.download_button
+    only accepts the whole file as bytes, so the finished export is held in memory once
+    while it is served. Very large exports are better run with `python -m db.export`.
+    """
+    st.set_page_config(layout="centered")
+    st.title("Export Entries")
+
+    run_registry = get_run_registry()
+    if not run_registry.runs:
+        st.warning("No hydroponic runs found.")
+        return
+
+    run_ids = select_runs(run_registry)
+    file_format = st.radio("Format", options=list(EXPORT_FORMATS), horizontal=True,
+                           format_func={'csv': "CSV", 'parquet': "Parquet", 'arrow': "Arrow IPC"}.get)
+
+    if st.button("Prepare export"):
+        mime_type, extension = EXPORT_FORMATS[file_format]
+        # Streamed to disk batch by batch, then read back in full for the download button
+        with tempfile.TemporaryFile() as export_file:
+            with st.spinner("Exporting..."):
+                rows = export_entries(export_file, file_format, run_ids)
+            export_file.seek(0)
+
+            st.success(f"Exported {rows} entries from {len(run_ids)} run(s)")
+            st.download_button("Download", data=export_file.read(), mime=mime_type,
+                               file_name=f"growos_entries_{date.today().isoformat()}{extension}")
+            st.caption("For very large exports use `python -m db.export`, which writes straight to disk.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+import pandas as pd
+import streamlit as st
+
+from components.run_selector import run_selector
+from db.bulk_import import (DEFAULT_CHUNK_SIZE, IMPORT_COLUMNS, import_entries, normalize_column_name,
+                            read_chunks)
+from db.settings_store import get_settings
+
+
+def get_file_format(uploaded_file):
+    return 'parquet' if uploaded_file.name.lower().endswith('.parquet') else 'csv'
+
+
+def select_column_map(preview):
+    """Lets the user map every source column onto an entry column, pre-filled by name"""
+    mapping_df = pd.DataFrame({
+        'source': preview.columns.astype(str),
+        'target': [normalize_column_name(col) if normalize_column_name(col) in IMPORT_COLUMNS else None
+                   for col in preview.columns]
+    })
+    edited = st.data_editor(
+        mapping_df,
+        column_config={
+            'source': st.column_config.TextColumn("File column", disabled=True),
+            'target': st.column_config.SelectboxColumn("Entry column", options=IMPORT_COLUMNS)
+        },
+        hide_index=True,
+        key="import_column_map"
+    )
+    # Cleared targets stay in the map as None so those columns are skipped
+    return {row.source: row.target or None for row in edited.itertuples()}
+
+
+def main():
+    st.set_page_config(layout="wide")
+    st.title("Import Entries")
+
+    uploaded_file = st.file_uploader("Historical log (CSV or Parquet)", type=["csv", "parquet"])
+    if uploaded_file is None:
+        return
+
+    file_format = get_file_format(uploaded_file)
+    preview = next(read_chunks(uploaded_file, file_format, chunk_size=5), pd.DataFrame())
+    uploaded_file.seek(0)
+
+    st.subheader("Preview")
+    st.dataframe(preview)
+
+    st.subheader("Column Mapping")
+    column_map = select_column_map(preview)
+
+    use_file_runs = st.checkbox("Take the run from a run_id column in the file",
+                                value='run_id' in column_map.values())
+    run_id = None
+    if not use_file_runs:
+        selected_run = run_selector()
+        run_id = selected_run.id if selected_run else None
+
+    chunk_size = st.number_input("Rows per chunk", min_value=100, max_value=1_000_000,
+                                 value=DEFAULT_CHUNK_SIZE, step=1000)
+
+    if st.button("Import", disabled=not use_file_runs and run_id is None):
+        status = st.empty()
+
+        def show_progress(result):
+            status.text(f"{result.rows_read} rows read, {result.rows_imported} imported, "
+                        f"{result.rows_per_second:.0f} rows/s")
+
+        try:
+            result = import_entries(uploaded_file, file_format, get_settings().username,
+                                    run_id=run_id, column_map=column_map,
+                                    chunk_size=int(chunk_size), progress=show_progress)
+        except Exception as e:
+            st.error(f"Import failed, nothing was written: {str(e)}")
+            return
+
+        status.empty()
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Rows read", result.rows_read)
+        col2.metric("Imported", result.rows_imported)
+        col3.metric("Rejected", result.rows_rejected)
+        col4.metric("Rows/s", f"{result.rows_per_second:.0f}")
+
+        if not result.rejected_sample.empty:
+            st.subheader("Rejected Rows")
+            st.caption(f"Showing the first {len(result.rejected_sample)} of {result.rows_rejected}")
+            st.dataframe(result.rejected_sample)
+
+
+if __name__ == "__main__":
+    main()
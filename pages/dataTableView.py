@@ -1,133 +1,160 @@
 import streamlit as st
 import pandas as pd
-from sqlalchemy.orm import Session
-from datetime import datetime
 
 from components.run_selector import run_selector
-from db.database import conn
-from db.database_handler import get_all_entries, sync_edited_data
-from model.hydro_data_entry import get_entry_from_df, HydroDataEntry, get_all_entries_df
+from db.database_handler import DEFAULT_PAGE_SIZE, get_entries_page, sync_edited_data
+from model.entry_changes import EntryChanges, changes_from_editor_state
 
+PAGE_SIZES = [50, 100, 250, 500]
 
-def get_changes(edited_df: pd.DataFrame, original_df: pd.DataFrame) -> pd.DataFrame:
+CHANGE_STATUSES = ['New', 'Modified', 'Deleted']
+
+STATUS_STYLES = {
+    'New': 'background-color: rgba(33, 195, 84, 0.25)',
+    'Modified': 'background-color: rgba(255, 164, 33, 0.3)',
+    'Deleted': 'background-color: rgba(255, 75, 75, 0.25)'
+}
+
+
+def _format_value(value):
+    if value is None or value is pd.NA or (isinstance(value, float) and pd.isna(value)):
+        return ""
+    if isinstance(value, float):
+        return f"{value:g}"
+    return str(value)
+
+
+def get_changes(entry_changes: EntryChanges):
     """
-    Returns a DataFrame containing only the changed rows with their modifications.
+    Returns the pending changes as one DataFrame with a row per changed entry, plus a
+    mask of the cells that changed. Changed cells of modified entries read "old → new".
 
     Args:
-        edited_df: DataFrame from st.data_editor
-        original_df: Original DataFrame before edits
+        entry_changes: Changes of the current editor state
 
     Returns:
-        DataFrame with changes highlighted and only modified rows included
+        (changes DataFrame with 'status' and 'id' columns, boolean mask of changed cells)
     """
-    changes = []
-
-    # Handle modified and new rows
-    for idx, row in edited_df.iterrows():
-        if pd.isna(row['id']):  # New entry
-            changes.append({
-                'status': 'New',
-                'id': 'NEW',
-                **{col: {'value': row[col], 'changed': True} for col in edited_df.columns if col != 'id'}
-            })
-        else:  # Check for modifications in existing entries
-            original_row = original_df[original_df['id'] == row['id']].iloc[0] if not original_df[
-                original_df['id'] == row['id']].empty else None
-
-            if original_row is not None and not row.equals(original_row):
-                change_dict = {'status': 'Modified', 'id': row['id']}
-                for col in edited_df.columns:
-                    if col != 'id':
-                        changed = row[col] != original_row[col]
-                        change_dict[col] = {
-                            'value': row[col],
-                            'changed': changed,
-                            'original': original_row[col] if changed else None
-                        }
-                changes.append(change_dict)
-
-    # Handle deleted rows
-    edited_ids = set(edited_df['id'].dropna().astype(int))
-    original_ids = set(original_df['id'].dropna().astype(int))
-    deleted_ids = original_ids - edited_ids
-
-    for deleted_id in deleted_ids:
-        deleted_row = original_df[original_df['id'] == deleted_id].iloc[0]
-        changes.append({
-            'status': 'Deleted',
-            'id': deleted_id,
-            **{col: {'value': deleted_row[col], 'changed': True} for col in edited_df.columns if col != 'id'}
-        })
-
-    return changes
-
-
-
-
-# Update your main Streamlit app:
-def display_changes(changes):
+    value_columns = list(entry_changes.modified_rows.columns)
+
+    def as_text(rows):
+        return rows.reindex(columns=value_columns).astype(object).map(_format_value)
+
+    new_rows = entry_changes.new_rows.reindex(columns=value_columns).reset_index(drop=True)
+    modified = as_text(entry_changes.modified_rows)
+    original = as_text(entry_changes.original_rows)
+    changed_cells = entry_changes.changed_cells.reindex(columns=value_columns, fill_value=False)
+    deleted = entry_changes.deleted_rows.reindex(columns=value_columns)
+
+    changes_df = pd.concat([
+        as_text(new_rows).assign(status='New', id='NEW'),
+        modified.where(~changed_cells, original + " → " + modified).assign(
+            status='Modified', id=[str(entry_id) for entry_id in modified.index]),
+        as_text(deleted).assign(status='Deleted', id=[str(entry_id) for entry_id in deleted.index])
+    ], ignore_index=True)
+    mask = pd.concat([new_rows.notna(), changed_cells, deleted.notna()], ignore_index=True)
+
+    return changes_df.reindex(columns=['status', 'id'] + value_columns), mask.astype(bool)
+
+
+def display_changes(changes_df: pd.DataFrame, mask: pd.DataFrame):
     """
-    Displays the changes in a formatted way using Streamlit components.
+    Displays all pending changes as a single styled dataframe, changed cells highlighted
+    in the color of their row's status and filterable by status.
     """
-    if not changes:
+    if changes_df.empty:
         st.info("No changes detected")
         return
 
-    for change in changes:
-        status_color = {
-            'New': 'green',
-            'Modified': 'orange',
-            'Deleted': 'red'
-        }[change['status']]
-
-        with st.expander(f"{change['status']} Entry (ID: {change['id']})", expanded=True):
-            cols = st.columns([1, 1, 1])
-
-            # Column headers
-            cols[0].markdown("**Field**")
-            cols[1].markdown("**New Value**")
-            cols[2].markdown("**Original Value**")
-
-            # Display each changed field
-            for field, details in change.items():
-                if field not in ['status', 'id']:
-                    if details['changed']:
-                        cols[0].markdown(f"**{field}**")
-                        cols[1].markdown(f"```{details['value']}```")
-                        if change['status'] == 'Modified':
-                            cols[2].markdown(f"```{details['original']}```")
-                        else:
-                            cols[2].markdown("*N/A*")
+    counts = changes_df['status'].value_counts()
+    statuses = st.multiselect(
+        "Show",
+        options=[status for status in CHANGE_STATUSES if status in counts],
+        default=[status for status in CHANGE_STATUSES if status in counts],
+        format_func=lambda status: f"{status} ({counts[status]})",
+        key="pending_changes_statuses"
+    )
+    visible = changes_df['status'].isin(statuses)
+    changes_df = changes_df[visible]
+    mask = mask[visible]
+
+    def highlight(df):
+        styles = pd.DataFrame("", index=df.index, columns=df.columns)
+        row_styles = df['status'].map(STATUS_STYLES)
+        for col in mask.columns:
+            styles[col] = row_styles.where(mask[col], "")
+        styles['status'] = row_styles
+        return styles
+
+    st.dataframe(changes_df.style.apply(highlight, axis=None), hide_index=True)
+
+
+def set_page_cursor(**cursor):
+    st.session_state["table_page_cursor"] = cursor
+    # Editor edits refer to row positions of the page they were made on
+    st.session_state.pop("hydro_data_editor", None)
+
+
+def display_page_navigation(page, has_pending_changes):
+    """Older/latest/newer buttons, disabled while the visible page has unsaved edits"""
+    cols = st.columns([1, 1, 1, 3])
+    cols[0].button("← Older", disabled=has_pending_changes or not page.has_older,
+                   on_click=set_page_cursor, kwargs={'before': page.first_key})
+    cols[1].button("Latest", disabled=has_pending_changes or not page.has_newer,
+                   on_click=set_page_cursor)
+    cols[2].button("Newer →", disabled=has_pending_changes or not page.has_newer,
+                   on_click=set_page_cursor, kwargs={'after': page.last_key})
+    if has_pending_changes:
+        cols[3].caption("Save changes before switching pages")
 
 
 def main():
     st.set_page_config(layout="wide")
 
     selected_run = run_selector()
+    if selected_run is None:
+        st.info("No run selected")
+        return
+
+    # Paging starts over at the most recent entries whenever another run is selected
+    if st.session_state.get("table_page_run_id") != selected_run.id:
+        st.session_state["table_page_run_id"] = selected_run.id
+        set_page_cursor()
+
+    page_size = st.selectbox("Rows per page", PAGE_SIZES, index=PAGE_SIZES.index(DEFAULT_PAGE_SIZE),
+                             key="table_page_size", on_change=set_page_cursor)
 
     try:
-        # Get original data
-        all_entries = get_all_entries()
-        all_entries_df = get_all_entries_df(all_entries)
+        # Only the visible page is loaded, diffed and saved
+        page = get_entries_page(run_id=selected_run.id, page_size=page_size,
+                                **st.session_state["table_page_cursor"])
+        if page.entries.empty and st.session_state["table_page_cursor"]:
+            set_page_cursor()
+            page = get_entries_page(run_id=selected_run.id, page_size=page_size)
+        page_df = page.entries
 
         # Show editor
-        edited_df = st.data_editor(
-            all_entries_df,
+        st.data_editor(
+            page_df,
             num_rows="dynamic",
             key="hydro_data_editor"
         )
 
-        # Get changes before saving
-        changes = get_changes(edited_df, all_entries_df)
+        # The editor already tracks which cells, added and deleted rows changed; read that
+        # delta once per rerun and share it with the save path instead of diffing frames
+        entry_changes = changes_from_editor_state(st.session_state.get("hydro_data_editor"), page_df)
+        changes_df, changed_cells = get_changes(entry_changes)
+
+        display_page_navigation(page, not entry_changes.is_empty)
 
         # Show changes in a dedicated section
         st.markdown("---")
         st.subheader("Pending Changes")
-        display_changes(changes)
+        display_changes(changes_df, changed_cells)
 
         # Add a save button
         if st.button('Save Changes'):
-            sync_edited_data(edited_df, all_entries_df)
+            sync_edited_data(entry_changes)
 
     except Exception as e:
         st.error(f"An error occurred: {str(e)}")
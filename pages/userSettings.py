@@ -1,115 +1,16 @@
 import streamlit as st
-from streamlit_local_storage import LocalStorage
-import json
+from db.settings_store import get_settings, update_settings
 
 st.set_page_config(layout="wide")
 st.title("Settings")
 
-local_storage = LocalStorage()
-
-# Initialize default nutrient profiles if not existing
-if local_storage.getItem("nutrient_profiles") is None:
-    default_profiles = {
-        "leafy_greens": {
-            "seedling": {"ph_target": 5.8, "ec_target": 0.8, "n": "low", "p": "low", "k": "low"},
-            "vegetative": {"ph_target": 5.8, "ec_target": 1.2, "n": "high", "p": "medium", "k": "medium"},
-            "harvest": {"ph_target": 5.8, "ec_target": 1.4, "n": "high", "p": "medium", "k": "medium"}
-        },
-        "fruiting": {
-            "seedling": {"ph_target": 5.8, "ec_target": 0.8, "n": "low", "p": "low", "k": "low"},
-            "vegetative": {"ph_target": 6.0, "ec_target": 1.5, "n": "high", "p": "medium", "k": "medium"},
-            "flowering": {"ph_target": 6.2, "ec_target": 2.0, "n": "medium", "p": "high", "k": "high"},
-            "fruiting": {"ph_target": 6.0, "ec_target": 2.2, "n": "low", "p": "high", "k": "high"}
-        },
-        "herbs": {
-            "seedling": {"ph_target": 5.6, "ec_target": 0.5, "n": "low", "p": "low", "k": "low"},
-            "vegetative": {"ph_target": 5.8, "ec_target": 1.0, "n": "medium", "p": "medium", "k": "medium"},
-            "harvest": {"ph_target": 5.8, "ec_target": 1.2, "n": "medium", "p": "medium", "k": "medium"}
-        }
-    }
-    local_storage.setItem("nutrient_profiles", json.dumps(default_profiles))
-
-# Initialize default nutrient products if not existing
-if local_storage.getItem("nutrient_products") is None:
-    default_products = {
-        "hydro_vega": {
-            "n": "high",
-            "p": "medium",
-            "k": "medium",
-            "ml_per_liter_light": 1.5,
-            "ml_per_liter_medium": 3.0,
-            "ml_per_liter_heavy": 4.5,
-            "stage": "vegetative"
-        },
-        "hydro_flora": {
-            "n": "low",
-            "p": "high",
-            "k": "high",
-            "ml_per_liter_light": 1.5,
-            "ml_per_liter_medium": 3.0,
-            "ml_per_liter_heavy": 4.5,
-            "stage": "flowering"
-        },
-        "boost": {
-            "n": "low",
-            "p": "high",
-            "k": "medium",
-            "ml_per_liter_light": 0.5,
-            "ml_per_liter_medium": 1.0,
-            "ml_per_liter_heavy": 2.0,
-            "stage": "flowering"
-        },
-        "rhizotonic": {
-            "n": "low",
-            "p": "low",
-            "k": "low",
-            "ml_per_liter_light": 1.0,
-            "ml_per_liter_medium": 2.0,
-            "ml_per_liter_heavy": 4.0,
-            "stage": "all"
-        }
-    }
-    local_storage.setItem("nutrient_products", json.dumps(default_products))
-
-# Initialize default system types if not existing
-if local_storage.getItem("system_types") is None:
-    default_systems = {
-        "dwc": {"description": "Deep Water Culture", "ec_modifier": 1.0, "change_frequency_days": 14},
-        "nft": {"description": "Nutrient Film Technique", "ec_modifier": 0.8, "change_frequency_days": 7},
-        "drip": {"description": "Drip System", "ec_modifier": 1.2, "change_frequency_days": 10},
-        "ebb_flow": {"description": "Ebb and Flow", "ec_modifier": 1.1, "change_frequency_days": 10}
-    }
-    local_storage.setItem("system_types", json.dumps(default_systems))
-
-# Initialize default recommendation settings if not existing
-if local_storage.getItem("nutrient_recommendation_settings") is None:
-    default_settings = {
-        "enabled": True,
-        "system_type": "dwc",
-        "plant_type": "leafy_greens",
-        "growth_stage": "vegetative",
-        "ec_tolerance": 0.3,
-        "ph_tolerance": 0.3,
-        "aggressive_correction": False,
-        "auto_adjust": True,
-        "notification_frequency": "daily",
-        "water_volume_liters": 20
-    }
-    local_storage.setItem("nutrient_recommendation_settings", json.dumps(default_settings))
+settings = get_settings()
 
 # Load current settings
-try:
-    nutrient_settings = json.loads(local_storage.getItem("nutrient_recommendation_settings"))
-    nutrient_profiles = json.loads(local_storage.getItem("nutrient_profiles"))
-    nutrient_products = json.loads(local_storage.getItem("nutrient_products"))
-    system_types = json.loads(local_storage.getItem("system_types"))
-except:
-    st.error("Error loading settings. Resetting to defaults.")
-    local_storage.removeItem("nutrient_recommendation_settings")
-    local_storage.removeItem("nutrient_profiles")
-    local_storage.removeItem("nutrient_products")
-    local_storage.removeItem("system_types")
-    st.rerun()
+nutrient_settings = settings.nutrient_settings
+nutrient_profiles = settings.nutrient_profiles
+nutrient_products = settings.nutrient_products
+system_types = settings.system_types
 
 # Create tabs for different settings sections
 tab1, tab2, tab3, tab4, tab5 = st.tabs(
@@ -118,11 +19,11 @@ tab1, tab2, tab3, tab4, tab5 = st.tabs(
 with tab1:
     general_form = st.form(key="general_settings_form")
     with general_form:
-        username = general_form.text_input("Username", value=local_storage.getItem("username") or "")
+        username = general_form.text_input("Username", value=settings.username or "")
         submit_general = general_form.form_submit_button("Save General Settings")
 
         if submit_general:
-            local_storage.setItem("username", username)
+            update_settings(username=username)
             st.success("General settings saved")
 
 with tab2:
@@ -233,7 +134,7 @@ with tab2:
                 "base_water_ec": base_water_ec
             }
 
-            local_storage.setItem("nutrient_recommendation_settings", json.dumps(nutrient_settings))
+            update_settings(nutrient_settings=nutrient_settings)
             st.success("Nutrient recommendation settings saved")
 
 with tab3:
@@ -311,7 +212,7 @@ with tab3:
                 else:
                     st.error("Please provide a profile name")
 
-            local_storage.setItem("nutrient_profiles", json.dumps(nutrient_profiles))
+            update_settings(nutrient_profiles=nutrient_profiles)
             st.success(success_msg)
 
 with tab4:
@@ -403,7 +304,7 @@ with tab4:
                 else:
                     st.error("Please provide a product name")
 
-            local_storage.setItem("nutrient_products", json.dumps(nutrient_products))
+            update_settings(nutrient_products=nutrient_products)
             st.success(success_msg)
 
 with tab5:
@@ -464,7 +365,7 @@ with tab5:
                 else:
                     st.error("Please provide both system key and description")
 
-            local_storage.setItem("system_types", json.dumps(system_types))
+            update_settings(system_types=system_types)
             st.success(success_msg)
 
 # Summary container
@@ -476,10 +377,10 @@ with summary_container:
 
     with col1:
         st.write("### General Settings")
-        if local_storage.getItem("username") is None:
+        if settings.username is None:
             st.write("Username not set")
         else:
-            st.write(f"Username: {local_storage.getItem('username')}")
+            st.write(f"Username: {settings.username}")
 
     with col2:
         st.write("### Nutrient Recommendations")
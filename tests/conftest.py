@@ -0,0 +1,20 @@
+import os
+import sys
+
+import pytest
+import streamlit as st
+from streamlit import config
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def sqlite_database(tmp_path_factory):
+    """Points the hydro_db connection at a throwaway SQLite database"""
+    root = tmp_path_factory.mktemp("app")
+    (root / ".streamlit").mkdir()
+    (root / ".streamlit" / "secrets.toml").write_text(
+        f'[connections.hydro_db]\nurl = "sqlite:///{root / "hydro.db"}"\n')
+    config.set_option("secrets.files", [str(root / ".streamlit" / "secrets.toml")])
+    st.secrets._reset()
+    return root
@@ -0,0 +1,42 @@
+from datetime import date
+
+from sqlalchemy import delete, insert, text
+
+
+def migrate_from_baseline(conn):
+    """Turns the test database back into a pre-migration one and upgrades it again"""
+    from db import migrations
+
+    with conn.engine.begin() as connection:
+        connection.execute(text("ALTER TABLE hydro_data_entry DROP COLUMN updated_at"))
+        connection.execute(delete(migrations.schema_migrations).where(migrations.schema_migrations.c.version >= 2))
+    migrations._migrated_engines.discard(conn.engine.url)
+    migrations.run_migrations(conn.engine)
+
+
+def test_edit_after_upgrade_reaches_incremental_frame():
+    from db.database import conn
+    from db.database_handler import get_entries_page, sync_edited_data
+    from db.incremental_loader import IncrementalEntryFrame
+    from model.entry_changes import changes_from_editor_state
+    from model.hydro_data_entry import HydroDataEntry
+    from model.hydro_run import HydroRun
+
+    username = "upgraded"
+    with conn.engine.begin() as connection:
+        run_id = connection.execute(insert(HydroRun.__table__).values(
+            name="Baseline run", start_date=date(2024, 1, 1), username=username)).inserted_primary_key[0]
+        connection.execute(insert(HydroDataEntry.__table__), [
+            {'run_id': run_id, 'date': date(2024, 1, day), 'ph_initial': 6.0, 'ec_initial': 1.2,
+             'ph_final': 6.0, 'ec_final': 1.2, 'light_hours': 18, 'light_intensity': 100}
+            for day in (1, 2)
+        ])
+    migrate_from_baseline(conn)
+
+    frame = IncrementalEntryFrame(run_id, username, ['ph_initial'])
+    assert frame.refresh()['ph_initial'].tolist() == [6.0, 6.0]
+
+    page = get_entries_page(run_id=run_id, username=username).entries
+    sync_edited_data(changes_from_editor_state({"edited_rows": {0: {"ph_initial": 5.5}}}, page))
+
+    assert frame.refresh()['ph_initial'].tolist() == [5.5, 6.0]
@@ -0,0 +1,51 @@
+import time
+
+import pandas as pd
+from sqlalchemy import update
+
+
+def test_writes_from_other_processes_change_the_version(monkeypatch):
+    import db.query_cache as query_cache
+    from db.database import conn
+    from model.data_version import DataVersion
+
+    monkeypatch.setattr(query_cache, "VERSION_POLL_SECONDS", 0)
+    before = query_cache.get_data_version()
+
+    # What a CLI importer or another replica does in its write transaction
+    table = DataVersion.__table__
+    with conn.engine.begin() as connection:
+        connection.execute(update(table).where(table.c.id == 1).values(version=table.c.version + 1))
+
+    assert query_cache.get_data_version() != before
+
+
+def test_own_bump_changes_the_version_immediately():
+    from db.query_cache import bump_data_version, get_data_version
+
+    before = get_data_version()
+    bump_data_version()
+    assert get_data_version() != before
+
+
+def test_cached_entry_pages_are_copied_per_caller():
+    from db.query_cache import cached_query
+    from model.hydro_data_entry import EntryPage
+
+    @cached_query
+    def load_page():
+        return EntryPage(pd.DataFrame({'id': [1], 'ph_initial': [6.0]}), has_older=False, has_newer=False)
+
+    load_page().entries.loc[0, 'ph_initial'] = 5.0
+    assert load_page().entries.loc[0, 'ph_initial'] == 6.0
+
+
+def test_entries_expire_after_ttl():
+    from db.query_cache import QueryCache
+
+    cache = QueryCache(ttl=0.05)
+    cache.set("key", "value")
+    assert cache.get("key") == (True, "value")
+
+    time.sleep(0.1)
+    assert cache.get("key") == (False, None)
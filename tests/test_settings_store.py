@@ -0,0 +1,54 @@
+import json
+
+import pytest
+from streamlit.testing.v1 import AppTest
+
+
+def settings_app():
+    import streamlit as st
+    from db.settings_store import get_settings, update_settings
+
+    settings = get_settings()
+    update_settings(selected_run_id=5)
+    st.write(settings.nutrient_profiles)
+
+
+@pytest.fixture
+def local_storage(monkeypatch):
+    """Fake browser local storage; getAll answers None until `answered` is set"""
+    import db.settings_store as settings_store
+
+    browser = {
+        'answered': False,
+        'items': {"selected_run_id": "3", "nutrient_profiles": json.dumps({"mine": {"veg": {}}})},
+        'writes': []
+    }
+
+    def component(method, key, itemKey=None, itemValue=None, default=None):
+        if method == "getAll":
+            return dict(browser['items']) if browser['answered'] else default
+        browser['writes'].append((method, itemKey, itemValue))
+
+    monkeypatch.setattr(settings_store, "_st_local_storage", component)
+    monkeypatch.setattr(settings_store, "WRITE_DEBOUNCE_SECONDS", 0)
+    return browser
+
+
+def test_first_run_placeholder_is_not_cached_or_written(local_storage):
+    app = AppTest.from_function(settings_app).run()
+
+    assert not app.exception
+    assert "settings_store" not in app.session_state
+    assert local_storage['writes'] == []
+
+
+def test_stored_settings_survive_once_browser_answers(local_storage):
+    app = AppTest.from_function(settings_app).run()
+    local_storage['answered'] = True
+    app.run()
+
+    assert not app.exception
+    written = {key: value for _, key, value in local_storage['writes']}
+    assert written["selected_run_id"] == 5
+    assert "nutrient_profiles" not in written
+    assert app.session_state["settings_store"].settings.nutrient_profiles == {"mine": {"veg": {}}}